@@ -1,4 +1,7 @@
 import os
+import shutil
+
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -36,4 +39,21 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_queries',
 ]
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings):
+    """Миниатюры строятся прямо в запросе: фоновый поток писал бы
+    в тестовую базу в памяти одновременно с её очисткой после теста."""
+    settings.THUMBNAIL_WORKERS = 0
+
+
+def pytest_configure(config):
+    from core.testing import use_temporary_caches
+    config.cache_directory = use_temporary_caches()
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(config.cache_directory, ignore_errors=True)
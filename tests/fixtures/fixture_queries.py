@@ -0,0 +1,14 @@
+import pytest
+from core.middleware import get_query_budget
+from django.urls import resolve
+
+
+@pytest.fixture
+def assert_query_budget(django_assert_max_num_queries):
+    """Проверяет, что запрос к странице укладывается в бюджет SQL-запросов
+    из `settings.QUERY_BUDGETS`."""
+    def check(client, url, method='get', data=None):
+        budget = get_query_budget(resolve(url).view_name)
+        with django_assert_max_num_queries(budget):
+            return getattr(client, method)(url, data)
+    return check
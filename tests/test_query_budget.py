@@ -0,0 +1,86 @@
+from io import BytesIO
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from posts.models import Comment, Follow, Post
+from PIL import Image
+from posts.urls import app_name, urlpatterns
+
+pytestmark = [pytest.mark.django_db]
+
+POST_ROUTES = {
+    'post_create': {'text': 'Новый пост'},
+    'post_edit': {'text': 'Исправленный пост'},
+    'add_comment': {'text': 'Комментарий'},
+}
+
+
+@pytest.fixture
+def busy_feed(mixer, user, another_user, group):
+    """Автор и группа с постами, комментариями и подписками — на таком
+    наборе N+1 запросов сразу выходит за бюджет."""
+    posts = mixer.cycle(15).blend(Post, author=user, group=group, image='')
+    for post in posts:
+        mixer.cycle(3).blend(Comment, post=post, author=another_user)
+    Follow.objects.create(user=user, author=another_user)
+    mixer.cycle(5).blend(Post, author=another_user, group=group, image='')
+    cache.clear()
+    return posts[0]
+
+
+def route_url(pattern, post):
+    values = {
+        'slug': post.group.slug,
+        'username': 'AnotherUser',
+        'post_id': post.pk,
+    }
+    kwargs = {name: values[name] for name in pattern.pattern.converters}
+    return reverse(f'{app_name}:{pattern.name}', kwargs=kwargs)
+
+
+def test_every_route_has_budget():
+    missing = [
+        pattern.name for pattern in urlpatterns
+        if f'{app_name}:{pattern.name}' not in settings.QUERY_BUDGETS
+    ]
+    assert not missing, (
+        f'Задайте бюджет запросов в `QUERY_BUDGETS` для страниц {missing}'
+    )
+
+
+@pytest.mark.parametrize(
+    'pattern', urlpatterns, ids=[pattern.name for pattern in urlpatterns]
+)
+def test_route_query_budget(pattern, user_client, busy_feed,
+                            assert_query_budget):
+    url = route_url(pattern, busy_feed)
+    assert_query_budget(user_client, url)
+    if pattern.name in POST_ROUTES:
+        assert_query_budget(
+            user_client, url, 'post', POST_ROUTES[pattern.name]
+        )
+
+
+def test_post_with_image_query_budget(settings, mock_media, user_client,
+                                      busy_feed, assert_query_budget):
+    """Картинка добавляет запросы хранилища файлов: они тоже в бюджете.
+
+    Миниатюры, как в production, строятся в фоне после фиксации
+    транзакции, а не в запросе; в транзакции теста они не строятся.
+    """
+    settings.THUMBNAIL_WORKERS = 2
+    output = BytesIO()
+    Image.new('RGB', (50, 50), 'red').save(output, 'JPEG')
+    image = SimpleUploadedFile('image.jpg', output.getvalue())
+    url = reverse(f'{app_name}:post_create')
+    assert_query_budget(
+        user_client, url, 'post', {
+            'text': 'Пост с картинкой',
+            'group': busy_feed.group_id,
+            'image': image,
+        }
+    )
+    assert Post.objects.filter(text='Пост с картинкой').exclude(image='')
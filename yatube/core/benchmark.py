@@ -0,0 +1,318 @@
+"""Нагрузочный прогон всех публичных страниц на синтетических данных.
+
+``build_dataset`` заполняет базу пользователями, группами, постами,
+комментариями и подписками, сгенерированными ``mixer`` и ``Faker``.
+Авторы и подписки распределены неравномерно, как в живой соцсети:
+у немногих авторов большая часть постов и подписчиков. Данные пишутся
+через ``bulk_create`` в обход сигналов, поэтому в конце счётчики,
+полнотекстовый индекс и ленты подписок перестраиваются целиком.
+
+``run_routes`` запрашивает каждую страницу из ``posts.urls``,
+``users.urls`` и ``about.urls`` и считает перцентили времени ответа,
+число SQL-запросов и выделенную Python память. Запуск и сравнение
+с эталоном — команда ``benchmark``.
+"""
+import math
+import platform
+import random
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate, islice
+
+import django
+from about import urls as about_urls
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from faker import Faker
+from mixer.backend.django import Mixer
+from posts import counters, feed
+from posts import api_urls
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post, User
+from posts.transfer import bulk_create_dated
+from users import urls as users_urls
+
+from .middleware import QueryCounter
+
+TIERS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+URL_MODULES = (posts_urls, api_urls, users_urls, about_urls)
+# Страницы, которые нельзя запрашивать повторно без порчи данных
+# или сессии замера.
+SKIPPED_ROUTES = {
+    'posts:post_delete': 'удаляет пост',
+    'users:logout': 'завершает сессию',
+}
+BATCH_SIZE = 1000
+TEXT_POOL_SIZE = 2000
+FOLLOWS_PER_USER = 20
+HISTORY = timedelta(days=365)
+
+
+def dataset_size(posts):
+    return {
+        'posts': posts,
+        'users': max(posts // 50, 10),
+        'groups': max(posts // 2000, 3),
+        'comments': posts // 2,
+    }
+
+
+class _Skewed:
+    """Выбор по закону Ципфа: i-й элемент выпадает с весом 1 / (i + 1),
+    поэтому немногие авторы и группы получают большую часть постов."""
+
+    def __init__(self, rng, population):
+        self.rng = rng
+        self.population = population
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) for rank in range(len(population))
+        ))
+
+    def __call__(self, count=1):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=count
+        )
+
+
+def _date(rng, now):
+    return now - timedelta(seconds=rng.randrange(HISTORY.days * 86400))
+
+
+def _bulk_create(model, objects):
+    while True:
+        chunk = list(islice(objects, BATCH_SIZE))
+        if not chunk:
+            return
+        with transaction.atomic():
+            bulk_create_dated(model, chunk)
+
+
+def build_dataset(posts, seed=0):
+    """Заполняет пустую базу данными на ``posts`` постов."""
+    size = dataset_size(posts)
+    rng = random.Random(seed)
+    now = timezone.now()
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    mixer = Mixer(commit=False)
+    texts = [fake.text(max_nb_chars=400) for _ in range(TEXT_POOL_SIZE)]
+
+    User.objects.bulk_create(
+        mixer.cycle(size['users']).blend(
+            User, username=mixer.sequence('bench_user_{0}')
+        ),
+        batch_size=BATCH_SIZE
+    )
+    Group.objects.bulk_create(
+        mixer.cycle(size['groups']).blend(
+            Group, slug=mixer.sequence('bench-group-{0}')
+        ),
+        batch_size=BATCH_SIZE
+    )
+    users = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    groups = list(Group.objects.order_by('pk').values_list('pk', flat=True))
+    popular_user = _Skewed(rng, users)
+    popular_group = _Skewed(rng, groups + [None])
+
+    _bulk_create(Post, (
+        Post(
+            pk=pk,
+            text=rng.choice(texts),
+            author_id=popular_user()[0],
+            group_id=popular_group()[0],
+            pub_date=_date(rng, now)
+        ) for pk in range(1, size['posts'] + 1)
+    ))
+
+    popular_post = _Skewed(
+        rng, list(Post.objects.values_list('pk', flat=True))
+    )
+    _bulk_create(Comment, (
+        Comment(
+            pk=pk,
+            text=rng.choice(texts)[:200],
+            post_id=popular_post()[0],
+            author_id=rng.choice(users),
+            created=_date(rng, now)
+        ) for pk in range(1, size['comments'] + 1)
+    ))
+
+    Follow.objects.bulk_create(
+        (
+            Follow(user_id=user, author_id=author)
+            for user in users
+            for author in set(popular_user(FOLLOWS_PER_USER))
+            if author != user
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+    counters.reconcile_posts(batch_size=BATCH_SIZE)
+    counters.reconcile_users(batch_size=BATCH_SIZE)
+    call_command(
+        'rebuild_search_index', batch_size=BATCH_SIZE, stdout=StringIO()
+    )
+    feed.rebuild()
+    return size
+
+
+def route_names():
+    for module in URL_MODULES:
+        for pattern in module.urlpatterns:
+            yield f'{module.app_name}:{pattern.name}', pattern
+
+
+def route_kwargs(pattern, user):
+    """Подставляет в параметры маршрута самые нагруженные объекты:
+    самую большую группу, самого популярного автора и свой пост."""
+    values = {
+        'slug': lambda: Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').values_list('slug', flat=True).first(),
+        'username': lambda: User.objects.order_by(
+            '-stats__follower_count'
+        ).exclude(pk=user.pk).values_list('username', flat=True).first(),
+        'post_id': lambda: user.posts.order_by('-comment_count').values_list(
+            'pk', flat=True
+        ).first(),
+        'uidb64': lambda: urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': lambda: default_token_generator.make_token(user),
+    }
+    return {name: values[name]() for name in pattern.pattern.converters}
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values),
+    }
+
+
+def _request(client, url, cold):
+    if cold:
+        cache.clear()
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    return response, elapsed, counter.count
+
+
+def _allocated(client, url, cold):
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure_route(client, url, requests, warmup, alloc_requests, cold):
+    for _ in range(warmup):
+        client.get(url)
+    latencies, queries = [], []
+    status = None
+    for _ in range(requests):
+        response, elapsed, count = _request(client, url, cold)
+        status = response.status_code
+        latencies.append(elapsed * 1000)
+        queries.append(count)
+    allocations = [
+        _allocated(client, url, cold) / 1024 for _ in range(alloc_requests)
+    ]
+    result = {
+        'path': url,
+        'status': status,
+        'latency_ms': summarize(latencies),
+        'queries': summarize(queries),
+    }
+    if allocations:
+        result['alloc_kb'] = summarize(allocations)
+    return result
+
+
+def run_routes(requests=50, warmup=5, alloc_requests=5, cold=False,
+               only=None):
+    """Замеряет все страницы от имени самого активного автора."""
+    user = User.objects.order_by('-stats__post_count').first()
+    client = Client()
+    client.force_login(user)
+    results = {}
+    for name, pattern in route_names():
+        if only and name not in only:
+            continue
+        if name in SKIPPED_ROUTES:
+            results[name] = {'skipped': SKIPPED_ROUTES[name]}
+            continue
+        url = reverse(name, kwargs=route_kwargs(pattern, user))
+        results[name] = measure_route(
+            client, url, requests, warmup, alloc_requests, cold
+        )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Возвращает список регрессий относительно эталонного прогона.
+
+    Время и память сравниваются по p95 с допуском ``threshold``
+    процентов, число запросов — строго.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or 'skipped' in current or 'skipped' in previous:
+            continue
+        for metric in ('latency_ms', 'alloc_kb'):
+            if metric not in current or metric not in previous:
+                continue
+            before = previous[metric]['p95']
+            after = current[metric]['p95']
+            if after > before * (1 + threshold / 100):
+                regressions.append(
+                    f'{name}: {metric} p95 {before:.1f} -> {after:.1f}'
+                )
+        before = previous['queries']['max']
+        after = current['queries']['max']
+        if after > before:
+            regressions.append(f'{name}: queries {before} -> {after}')
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'cache': settings.CACHES['default']['BACKEND'],
+    }
@@ -0,0 +1,305 @@
+"""Кэш в общем файле SQLite для всех процессов одного сервера.
+
+В отличие от ``LocMemCache`` у всех воркеров WSGI один и тот же кэш,
+поэтому сброс, сделанный одним процессом, сразу виден остальным.
+Файл открывается в режиме WAL: читатели не ждут писателей.
+
+Настройка::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+                'MAX_SIZE': 256 * 1024 * 1024,
+            },
+        }
+    }
+
+При превышении ``MAX_ENTRIES`` записей или ``MAX_SIZE`` байт удаляются
+давно не читавшиеся записи (LRU), пока не освободится
+``1 / CULL_FREQUENCY`` от лимита.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+ACCESS_RESOLUTION = 60
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_stats (id, entries, size) VALUES (1, 0, 0)',
+)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = pid
+        return self._local.db
+
+    def _write(self):
+        return _Transaction(self._db)
+
+    @staticmethod
+    def _encode(value):
+        # Целые числа хранятся как INTEGER без pickle: их чаще всего
+        # читают и увеличивают (счётчики поколений, лимиты).
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value, 8
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return sqlite3.Binary(data), len(data)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _delete_rows(self, db, where, params=()):
+        removed, size = db.execute(
+            f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache '
+            f'WHERE {where}', params
+        ).fetchone()
+        if removed:
+            db.execute(f'DELETE FROM cache WHERE {where}', params)
+            db.execute(
+                'UPDATE cache_stats SET entries = entries - ?, '
+                'size = size - ?', (removed, size)
+            )
+        return removed
+
+    def _store(self, db, key, value, timeout, now):
+        value, size = self._encode(value)
+        self._delete_rows(db, 'key = ?', (key,))
+        db.execute(
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, value, self.get_backend_timeout(timeout), now, size)
+        )
+        db.execute(
+            'UPDATE cache_stats SET entries = entries + 1, size = size + ?',
+            (size,)
+        )
+
+    def _cull(self, db, now):
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        over_entries = self._max_entries and entries > self._max_entries
+        over_size = self._max_size and size > self._max_size
+        if not over_entries and not over_size:
+            return
+        self._delete_rows(
+            db, 'expires IS NOT NULL AND expires <= ?', (now,)
+        )
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        keep = 1 - 1 / self._cull_frequency if self._cull_frequency else 0
+        target_entries = int(self._max_entries * keep)
+        target_size = int(self._max_size * keep)
+        victims = []
+        cursor = db.execute('SELECT key, size FROM cache ORDER BY accessed')
+        for key, row_size in cursor:
+            fits_entries = (
+                not self._max_entries or entries <= target_entries
+            )
+            fits_size = not self._max_size or size <= target_size
+            if fits_entries and fits_size:
+                break
+            victims.append(key)
+            entries -= 1
+            size -= row_size
+        cursor.close()
+        for start in range(0, len(victims), 500):
+            chunk = victims[start:start + 500]
+            self._delete_rows(
+                db, f'key IN ({",".join("?" * len(chunk))})', chunk
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and (row[0] is None or row[0] > now):
+                return False
+            self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_map = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found, stale = {}, []
+        db = self._db
+        made_keys = list(key_map)
+        for start in range(0, len(made_keys), 500):
+            chunk = made_keys[start:start + 500]
+            rows = db.execute(
+                f'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({",".join("?" * len(chunk))}) '
+                f'AND (expires IS NULL OR expires > ?)',
+                (*chunk, now)
+            ).fetchall()
+            for key, value, accessed in rows:
+                found[key] = self._decode(value)
+                if accessed < now - ACCESS_RESOLUTION:
+                    stale.append(key)
+        if stale:
+            # Время чтения обновляется не чаще раза в ACCESS_RESOLUTION
+            # секунд, чтобы горячие ключи не превращали чтения в записи.
+            with self._write() as db:
+                for start in range(0, len(stale), 500):
+                    chunk = stale[start:start + 500]
+                    db.execute(
+                        f'UPDATE cache SET accessed = ? '
+                        f'WHERE key IN ({",".join("?" * len(chunk))})',
+                        (now, *chunk)
+                    )
+        return {key_map[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._write() as db:
+            for key, value in data.items():
+                self._store(db, self._key(key, version), value, timeout, now)
+            self._cull(db, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            return db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now)
+            ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._write() as db:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                self._delete_rows(
+                    db, f'key IN ({",".join("?" * len(chunk))})', chunk
+                )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(
+                'SELECT value, size FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._decode(row[0]) + delta
+            encoded, size = self._encode(value)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (encoded, size, now, key)
+            )
+            db.execute(
+                'UPDATE cache_stats SET size = size + ?', (size - row[1],)
+            )
+            return value
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache')
+            db.execute('UPDATE cache_stats SET entries = 0, size = 0')
+
+    def close(self, **kwargs):
+        # Соединение живёт столько же, сколько поток: его переоткрытие
+        # на каждый запрос стоило бы дороже самого обращения к кэшу.
+        pass
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` сразу берёт блокировку записи, поэтому
+    чтение-изменение-запись внутри транзакции атомарно между процессами."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
@@ -0,0 +1,47 @@
+"""Настройка соединений с SQLite.
+
+При каждом новом соединении выполняются ``PRAGMA`` из
+``settings.SQLITE_PRAGMAS``:
+
+* ``journal_mode=WAL`` — читатели не ждут писателя и наоборот,
+  одновременно пишет только одно соединение;
+* ``synchronous=NORMAL`` — в режиме WAL база не портится при падении
+  процесса, а fsync выполняется только при checkpoint;
+* ``busy_timeout`` — сколько миллисекунд писатель ждёт освобождения
+  блокировки, прежде чем получить ``database is locked``;
+* ``mmap_size`` и ``cache_size`` — чтение страниц через отображение
+  файла в память и больший кэш страниц на соединение.
+
+Вместе с ``CONN_MAX_AGE`` соединение и его настройки живут между
+запросами, а не создаются заново на каждый. Соединения с репликами
+из ``DATABASE_REPLICAS`` открываются только для чтения.
+"""
+import sqlite3
+
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Обработчик ``connection_created``."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if connection.alias in settings.DATABASE_REPLICAS:
+            cursor.execute('PRAGMA query_only = ON')
+
+
+def copy_database(source, target):
+    """Копирует файл SQLite в реплику через backup API.
+
+    Копия пишется обычной транзакцией в файл реплики, поэтому её
+    открытые соединения не ломаются, а дочитывают прежние данные.
+    """
+    source = sqlite3.connect(source)
+    target = sqlite3.connect(target)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
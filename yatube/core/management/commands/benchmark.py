@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа, число SQL-запросов и память всех страниц '
+        'на синтетических данных во временной базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tier', choices=benchmark.TIERS, default='10k',
+            help='Объём данных: число постов'
+        )
+        parser.add_argument(
+            '--posts', type=int,
+            help='Точное число постов вместо --tier'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько замеров делать на каждую страницу'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Сколько запросов сделать до замеров'
+        )
+        parser.add_argument(
+            '--alloc-requests', type=int, default=5,
+            help='Сколько запросов замерять под tracemalloc'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help='Замерять только эти страницы (posts:main_page и т. п.)'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Куда записать результаты в JSON'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Допустимый рост p95 времени и памяти, %%'
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        posts = options['posts'] or benchmark.TIERS[options['tier']]
+        with tempfile.TemporaryDirectory() as directory:
+            report = self.run(posts, directory, options)
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if baseline is None:
+            return
+        regressions = benchmark.compare(
+            report['routes'], baseline['routes'], options['threshold']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно эталона:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def run(self, posts, directory, options):
+        caches = {
+            'default': {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            }
+        }
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(CACHES=caches, MEDIA_ROOT=directory):
+                start = time.monotonic()
+                size = benchmark.build_dataset(posts, seed=options['seed'])
+                self.stdout.write(
+                    f'Данные готовы за {time.monotonic() - start:.0f} с: '
+                    + ', '.join(f'{k} {v}' for k, v in size.items())
+                )
+                routes = benchmark.run_routes(
+                    requests=options['requests'],
+                    warmup=options['warmup'],
+                    alloc_requests=options['alloc_requests'],
+                    cold=options['cold'],
+                    only=options['routes'],
+                )
+                environment = benchmark.environment()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        for name, result in routes.items():
+            if 'skipped' in result:
+                self.stdout.write(f'{name:40} пропущено: {result["skipped"]}')
+                continue
+            latency = result['latency_ms']
+            self.stdout.write(
+                f'{name:40} p50 {latency["p50"]:7.1f} мс  '
+                f'p95 {latency["p95"]:7.1f} мс  '
+                f'p99 {latency["p99"]:7.1f} мс  '
+                f'запросов {result["queries"]["max"]}'
+            )
+        return {
+            'meta': {
+                'dataset': size,
+                'requests': options['requests'],
+                'cold_cache': options['cold'],
+                'seed': options['seed'],
+                'timestamp': int(time.time()),
+                **environment,
+            },
+            'routes': routes,
+        }
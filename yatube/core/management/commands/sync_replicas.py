@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db import copy_database
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик'
+
+    def handle(self, *args, **options):
+        primary = connections['default'].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Копировать можно только базу SQLite')
+        for alias in settings.DATABASE_REPLICAS:
+            target = connections[alias].settings_dict['NAME']
+            copy_database(primary['NAME'], target)
+            self.stdout.write(f'{alias}: {target}')
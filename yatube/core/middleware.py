@@ -0,0 +1,94 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class QueryCounter:
+    """Обёртка ``execute_wrapper``: считает запросы и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.monotonic() - start
+
+
+def get_query_budget(view_name):
+    return settings.QUERY_BUDGETS.get(
+        view_name, settings.QUERY_BUDGET_DEFAULT
+    )
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и пишет в лог превышения
+    бюджета из ``settings.QUERY_BUDGETS``.
+
+    При ``QUERY_COUNT_HEADER = True`` добавляет в ответ заголовки
+    ``X-Query-Count`` и ``X-Query-Time`` (мс).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = get_query_budget(view_name)
+        if counter.count > budget:
+            logger.warning(
+                'Query budget exceeded for %s (%s): %d queries > %d, '
+                '%.1f ms in database',
+                view_name, request.path, counter.count, budget,
+                counter.duration * 1000
+            )
+        if settings.QUERY_COUNT_HEADER:
+            response['X-Query-Count'] = str(counter.count)
+            response['X-Query-Time'] = f'{counter.duration * 1000:.1f}'
+        return response
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплик для безопасных запросов, см.
+    ``core/routers.py``.
+
+    Запрос, который что-то записал, ставит cookie: пока она жива,
+    запросы этого клиента читают с основной базы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        primary = (
+            request.method not in SAFE_METHODS
+            or PIN_COOKIE in request.COOKIES
+        )
+        with routers.request_scope(primary) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """Содержимое загруженного файла, хранится один раз на диске."""
+    digest = models.CharField('SHA-256', max_length=64, unique=True)
+    path = models.CharField('Путь на диске', max_length=255)
+    size = models.BigIntegerField('Размер')
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Содержимое файла'
+        verbose_name_plural = 'Содержимое файлов'
+
+    def __str__(self):
+        return self.path
+
+
+class StoredFile(models.Model):
+    """Имя файла, под которым его знают модели, и его содержимое."""
+    name = models.CharField('Имя', max_length=255, unique=True)
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        related_name='names',
+        verbose_name='Содержимое'
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
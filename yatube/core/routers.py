@@ -0,0 +1,83 @@
+"""Чтение с реплик базы данных.
+
+Реплики перечислены в ``settings.DATABASE_REPLICAS``. Чтение идёт на
+реплику, только когда ``ReplicaMiddleware`` разрешил это для текущего
+запроса: метод безопасный (GET, HEAD, OPTIONS) и клиент недавно ничего
+не записывал. Всё остальное — запись, запросы POST, management-команды,
+фоновые потоки — работает с основной базой.
+
+После первой записи в запросе оставшееся чтение тоже идёт на основную
+базу, а клиент получает cookie на ``REPLICA_PIN_SECONDS`` секунд, пока
+его следующие запросы читают с основной базы: так он сразу видит свой
+новый пост или комментарий, даже если реплика отстаёт.
+
+Страница, которая строит закэшированный фрагмент ленты, тоже читает с
+основной базы (``use_primary``): ключ фрагмента включает поколение
+ленты из кэша, и отстающая реплика сохранила бы под новым поколением
+старые строки на всё время жизни фрагмента.
+
+Локально реплики — копии файла SQLite, которые обновляет команда
+``sync_replicas``.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PRIMARY = DEFAULT_DB_ALIAS
+# Только что созданная сессия могла ещё не дойти до реплики.
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+
+
+class RequestState:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+@contextmanager
+def request_scope(primary=False):
+    """Разрешает чтение с реплики до конца блока, если не ``primary``."""
+    replicas = settings.DATABASE_REPLICAS
+    replica = None if primary or not replicas else random.choice(replicas)
+    previous = getattr(_state, 'request', None)
+    _state.request = RequestState(replica)
+    try:
+        yield _state.request
+    finally:
+        _state.request = previous
+
+
+def use_primary():
+    """Переводит чтение до конца текущего запроса на основную базу."""
+    state = getattr(_state, 'request', None)
+    if state is not None:
+        state.replica = None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = getattr(_state, 'request', None)
+        if (
+            state is None or state.replica is None or state.wrote
+            or model._meta.app_label in PRIMARY_APPS
+        ):
+            return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = getattr(_state, 'request', None)
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
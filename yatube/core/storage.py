@@ -0,0 +1,164 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл пишется на диск по частям, по пути его SHA-256 хеша:
+``blobs/ab/cd/abcd….jpg``. Двухуровневые подкаталоги держат в каждом
+каталоге не больше нескольких тысяч файлов, а одинаковые загрузки
+занимают место один раз. Модели по-прежнему видят обычные имена вроде
+``posts/small.gif``: таблица ``StoredFile`` связывает имя с содержимым
+``Blob``, у которого есть счётчик ссылок. Удаление имени уменьшает
+счётчик, файл на диске удаляется вместе с последней ссылкой.
+
+Содержимое по адресу ``/media/blobs/…`` никогда не меняется, поэтому
+отдаётся с ``BLOB_CACHE_CONTROL``: при ``DEBUG`` это делает
+``core.views.serve_media``, а в production — веб-сервер::
+
+    location /media/blobs/ {
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+Файлы, загруженные до появления хранилища, лежат по своим именам
+и продолжают открываться.
+
+Загрузка добавляет ссылку одним ``INSERT … ON CONFLICT DO UPDATE``:
+запись создаётся или её счётчик ссылок увеличивается. Первым запросом
+транзакции идёт запись, поэтому SQLite сразу берёт блокировку записи,
+и параллельные одинаковые загрузки ждут друг друга (``busy_timeout``),
+а не падают с ``database is locked`` при попытке записать из
+устаревшего снимка.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import Blob, StoredFile
+
+BLOB_DIR = 'blobs'
+BLOB_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Имя -> путь содержимого; пустая строка — файл без записи в StoredFile.
+CACHE_PREFIX = 'stored-file'
+
+
+def blob_path(digest, extension):
+    return posixpath.join(
+        BLOB_DIR, digest[:2], digest[2:4], digest + extension
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def _cache_key(self, name):
+        return f'{CACHE_PREFIX}:{hashlib.md5(name.encode()).hexdigest()}'
+
+    def _resolve(self, name):
+        key = self._cache_key(name)
+        path = cache.get(key)
+        if path is None:
+            path = (
+                StoredFile.objects.filter(name=name)
+                .values_list('blob__path', flat=True).first()
+            ) or ''
+            cache.set(key, path, None)
+        return path or name
+
+    def path(self, name):
+        return super().path(self._resolve(name))
+
+    def url(self, name):
+        return super().url(self._resolve(name))
+
+    def exists(self, name):
+        # Без кэша: по ответу выбирается имя нового файла.
+        return (
+            StoredFile.objects.filter(name=name).exists()
+            or os.path.exists(super().path(name))
+        )
+
+    def _write_temporary(self, content):
+        directory = super().path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(
+            dir=directory, prefix='.upload-', delete=False
+        ) as temporary:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.remove(temporary.name)
+                raise
+        return temporary.name, digest.hexdigest(), size
+
+    def _reference(self, digest, extension, size):
+        """Добавляет ссылку на содержимое и возвращает ``(id, path)``
+        его записи; вызывается в транзакции."""
+        table = Blob._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (digest, path, size, "references") '
+                f'VALUES (%s, %s, %s, 1) ON CONFLICT (digest) '
+                f'DO UPDATE SET "references" = {table}."references" + 1 '
+                f'RETURNING id, path',
+                [digest, blob_path(digest, extension), size]
+            )
+            return cursor.fetchone()
+
+    def _save(self, name, content):
+        temporary, digest, size = self._write_temporary(content)
+        try:
+            extension = os.path.splitext(name)[1].lower()
+            with transaction.atomic():
+                blob_id, path = self._reference(digest, extension, size)
+                full_path = super().path(path)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(temporary, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+                StoredFile.objects.create(name=name, blob_id=blob_id)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        cache.set(self._cache_key(name), path, None)
+        return name
+
+    def release(self, name):
+        """Убирает ссылку имени на содержимое; возвращает ``False``,
+        если имя не из этого хранилища."""
+        with transaction.atomic():
+            stored = (
+                StoredFile.objects.select_related('blob')
+                .filter(name=name).first()
+            )
+            if stored is None:
+                return False
+            stored.delete()
+            blob = stored.blob
+            Blob.objects.filter(pk=blob.pk).update(
+                references=F('references') - 1
+            )
+            if Blob.objects.filter(pk=blob.pk, references=0).delete()[0]:
+                # Файл удаляется до конца транзакции: параллельная
+                # загрузка того же содержимого упадёт на записи ссылки,
+                # а не сошлётся на удалённый файл.
+                try:
+                    os.remove(super().path(blob.path))
+                except FileNotFoundError:
+                    pass
+        cache.delete(self._cache_key(name))
+        return True
+
+    def delete(self, name):
+        if not self.release(name):
+            cache.delete(self._cache_key(name))
+            super().delete(name)
@@ -0,0 +1,109 @@
+"""Окружение тестов.
+
+Тесты не должны видеть кэш разработческого сервера и оставлять в нём
+поколения лент и соответствия имён файлов: на время прогона каждый
+кэш переносится в свой файл во временном каталоге.
+
+``lagging_replica`` подключает реплику, которая отстаёт от основной
+базы: в ней остаются данные на момент входа в блок.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def use_temporary_caches():
+    """Переносит кэши во временный каталог и возвращает его путь.
+
+    Вызывается до первого обращения к кэшу.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    settings.CACHES = {
+        alias: dict(
+            config, LOCATION=os.path.join(directory, f'{alias}.sqlite3')
+        )
+        for alias, config in settings.CACHES.items()
+    }
+    return directory
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = use_temporary_caches()
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+
+
+def copy_schema_and_rows(source, target):
+    """Копирует таблицы и индексы через соединение ``source``.
+
+    В отличие от backup API не ждёт конца транзакции: копия включает
+    незавершённые изменения самого ``source``.
+    """
+    schema = source.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+        "ORDER BY type = 'index'"
+    ).fetchall()
+    virtual = [
+        name for _, name, sql in schema if sql.startswith('CREATE VIRTUAL')
+    ]
+    tables = []
+    for kind, name, sql in schema:
+        # Служебные таблицы FTS создаются вместе со своей таблицей.
+        if any(name.startswith(f'{table}_') for table in virtual):
+            continue
+        target.execute(sql)
+        if kind == 'table':
+            tables.append(name)
+    for name in tables:
+        columns = [
+            row[1] for row in source.execute(f'PRAGMA table_info("{name}")')
+        ]
+        if name in virtual:
+            columns.insert(0, 'rowid')
+        names = ', '.join(f'"{column}"' for column in columns)
+        target.executemany(
+            f'INSERT INTO "{name}" ({names}) '
+            f'VALUES ({", ".join("?" * len(columns))})',
+            source.execute(f'SELECT {names} FROM "{name}"')
+        )
+    target.commit()
+
+
+@contextmanager
+def lagging_replica(alias='replica1'):
+    """Снимок тестовой базы в роли единственной реплики.
+
+    Снимок включает незавершённую транзакцию теста, а записи внутри
+    блока до реплики не доходят.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-replica-')
+    path = os.path.join(directory, 'replica.sqlite3')
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        copy_schema_and_rows(connection.connection, target)
+    finally:
+        target.close()
+    connections.databases[alias] = dict(
+        connections.databases[connection.alias], NAME=path
+    )
+    try:
+        with override_settings(DATABASE_REPLICAS=[alias]):
+            yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,452 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.contrib.sessions.models import Session
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from posts.models import Comment, FeedEntry, Post, UserStats
+
+from . import benchmark
+from .cache import SQLiteCache
+from .db import copy_database
+from .middleware import PIN_COOKIE, ReplicaMiddleware
+from .models import Blob
+from .routers import ReplicaRouter
+from .storage import BLOB_CACHE_CONTROL, ContentAddressedStorage
+from .views import serve_media
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+def open_database(path):
+    database = DatabaseWrapper(
+        {**connection.settings_dict, 'NAME': path}, alias='stress'
+    )
+    database.ensure_connection()
+    return database
+
+
+class SQLiteCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """Кэш хранит значения, ключи истекают по таймауту"""
+        self.cache.set('list', [1, 2, 3])
+        self.cache.set('short', 'value', timeout=0.01)
+        self.assertEqual(self.cache.get('list'), [1, 2, 3])
+        self.assertFalse(self.cache.add('list', 'other'))
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'again'))
+        self.cache.delete('list')
+        self.assertFalse(self.cache.has_key('list'))
+
+    def test_many_and_incr(self):
+        """get_many, set_many и incr работают пакетно и атомарно"""
+        self.cache.set_many({'a': 1, 'b': 'two'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'two'}
+        )
+        self.assertEqual(self.cache.incr('a', 10), 11)
+        self.assertEqual(self.cache.decr('a'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_processes(self):
+        """Все процессы видят один кэш, incr не теряет обновлений"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.make_cache().get('counter'), 200)
+
+    def test_lru_eviction_by_entries(self):
+        """При переполнении удаляются давно не читавшиеся ключи"""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=2)
+        cache.set('old', 1)
+        cache.set('used', 2)
+        cache._db.execute('UPDATE cache SET accessed = 0')
+        cache._db.execute(
+            "UPDATE cache SET accessed = ? WHERE key LIKE '%used'",
+            (time.time() + 100,)
+        )
+        for key in ('c', 'd', 'e'):
+            cache.set(key, key)
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get('used'), 2)
+        self.assertEqual(cache.get('e'), 'e')
+
+    def test_lru_eviction_by_size(self):
+        """Кэш не растёт больше MAX_SIZE байт"""
+        cache = self.make_cache(MAX_SIZE=10000)
+        for i in range(20):
+            cache.set(f'key{i}', 'x' * 1000)
+        entries, size = cache._db.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertEqual(
+            entries,
+            cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        )
+        self.assertEqual(cache.get('key19'), 'x' * 1000)
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+
+    @override_settings(QUERY_COUNT_HEADER=True)
+    def test_query_count_header(self):
+        """В отладочном режиме ответ содержит число запросов"""
+        cache.clear()
+        response = self.client.get('/')
+        self.assertIn('X-Query-Count', response)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    @override_settings(QUERY_COUNT_HEADER=False)
+    def test_no_header_in_production(self):
+        self.assertNotIn('X-Query-Count', self.client.get('/'))
+
+    @override_settings(QUERY_BUDGETS={'posts:main_page': 0})
+    def test_exceeded_budget_is_logged(self):
+        """Превышение бюджета пишется в лог"""
+        cache.clear()
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get('/')
+        self.assertIn('posts:main_page', logs.output[0])
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dataset_is_consistent(self):
+        """Синтетические данные проходят через счётчики и ленты"""
+        size = benchmark.build_dataset(200)
+        self.assertEqual(Post.objects.count(), size['posts'])
+        self.assertEqual(Comment.objects.count(), size['comments'])
+        self.assertEqual(
+            UserStats.objects.filter(post_count__gt=0).count(),
+            Post.objects.values('author').distinct().count()
+        )
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'day').count(), 1
+        )
+
+    def test_run_routes(self):
+        """Замеры собираются по всем страницам, опасные пропускаются"""
+        benchmark.build_dataset(100)
+        results = benchmark.run_routes(
+            requests=3, warmup=0, alloc_requests=1
+        )
+        self.assertIn('skipped', results['posts:post_delete'])
+        main_page = results['posts:main_page']
+        self.assertEqual(main_page['status'], 200)
+        self.assertGreater(main_page['queries']['max'], 0)
+        self.assertGreater(main_page['alloc_kb']['p50'], 0)
+        self.assertIn('about:tech', results)
+
+    def test_compare(self):
+        def route(latency, queries):
+            return {
+                'latency_ms': {'p95': latency},
+                'queries': {'max': queries},
+            }
+
+        baseline = {'a': route(10, 3), 'b': route(10, 3)}
+        results = {'a': route(11, 3), 'b': route(15, 4)}
+        regressions = benchmark.compare(results, baseline, threshold=20)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(item.startswith('b:') for item in regressions))
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 50), 2)
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    WRITERS = 4
+    ROWS_PER_WRITER = 50
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/db.sqlite3'
+        database = open_database(self.path)
+        with database.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (value INTEGER)')
+        database.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def count(self, database):
+        with database.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает настройки из SQLITE_PRAGMAS"""
+        database = open_database(self.path)
+        expected = {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+            'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'],
+            'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+        }
+        with database.cursor() as cursor:
+            for name, value in expected.items():
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], value)
+        database.close()
+
+    def test_readers_not_blocked_by_writer(self):
+        """Пока писатель держит транзакцию, читатели видят прежние данные
+        и не ждут его"""
+        locked, release = threading.Event(), threading.Event()
+
+        def write():
+            database = open_database(self.path)
+            with database.cursor() as cursor:
+                cursor.execute('BEGIN EXCLUSIVE')
+                cursor.execute('INSERT INTO item VALUES (1)')
+                locked.set()
+                release.wait(10)
+                cursor.execute('COMMIT')
+            database.close()
+
+        reader = open_database(self.path)
+        with ThreadPoolExecutor(1) as executor:
+            writer = executor.submit(write)
+            self.assertTrue(locked.wait(10))
+            start = time.monotonic()
+            counts = [self.count(reader) for _ in range(100)]
+            elapsed = time.monotonic() - start
+            release.set()
+            writer.result()
+        self.assertEqual(set(counts), {0})
+        self.assertLess(elapsed, 1)
+        self.assertEqual(self.count(reader), 1)
+        reader.close()
+
+    def test_concurrent_writers_and_readers(self):
+        """Одновременные писатели ждут друг друга, а не падают
+        с «database is locked»"""
+        def write(writer):
+            database = open_database(self.path)
+            for value in range(self.ROWS_PER_WRITER):
+                with database.cursor() as cursor:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.execute('INSERT INTO item VALUES (%s)', [value])
+                    cursor.execute('COMMIT')
+            database.close()
+
+        def read(reader):
+            database = open_database(self.path)
+            counts = [self.count(database) for _ in range(100)]
+            database.close()
+            return counts
+
+        with ThreadPoolExecutor(self.WRITERS * 2) as executor:
+            writers = [
+                executor.submit(write, i) for i in range(self.WRITERS)
+            ]
+            readers = [
+                executor.submit(read, i) for i in range(self.WRITERS)
+            ]
+            for future in writers:
+                future.result()
+            for future in readers:
+                counts = future.result()
+                self.assertEqual(counts, sorted(counts))
+        database = open_database(self.path)
+        self.assertEqual(
+            self.count(database), self.WRITERS * self.ROWS_PER_WRITER
+        )
+        database.close()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def serve(self, request, write=False):
+        """Прогоняет запрос через ReplicaMiddleware и возвращает базы,
+        выбранные для чтения до и после записи."""
+        used = []
+
+        def view(request):
+            used.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Post)
+                used.append(self.router.db_for_read(Post))
+            used.append(self.router.db_for_read(Session))
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(request)
+        return used, response
+
+    def test_safe_requests_read_from_replica(self):
+        """GET читает с одной реплики, сессии — с основной базы"""
+        (read, session), response = self.serve(self.factory.get('/'))
+        self.assertIn(read, ['replica1', 'replica2'])
+        self.assertEqual(session, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_client_to_primary(self):
+        """После записи чтение идёт на основную базу, и клиент получает
+        cookie, по которой следующие запросы тоже читают с неё"""
+        (before, after, _), response = self.serve(
+            self.factory.get('/'), write=True
+        )
+        self.assertNotEqual(before, 'default')
+        self.assertEqual(after, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        (read, _), _ = self.serve(request)
+        self.assertEqual(read, 'default')
+
+    def test_unsafe_requests_and_commands_use_primary(self):
+        """POST и код вне запроса работают только с основной базой"""
+        (read, _), _ = self.serve(self.factory.post('/'))
+        self.assertEqual(read, 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_copy_database(self):
+        """Реплика получает копию данных основной базы"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = open_database(f'{directory}/primary.sqlite3')
+        with primary.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (value INTEGER)')
+            cursor.execute('INSERT INTO item VALUES (1)')
+        primary.close()
+        replica_path = f'{directory}/replica.sqlite3'
+        copy_database(f'{directory}/primary.sqlite3', replica_path)
+        replica = open_database(replica_path)
+        with replica.cursor() as cursor:
+            cursor.execute('SELECT value FROM item')
+            self.assertEqual(cursor.fetchall(), [(1,)])
+        replica.close()
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        cache.clear()
+        self.storage = ContentAddressedStorage(
+            location=self.directory, base_url='/media/'
+        )
+
+    def test_identical_uploads_are_stored_once(self):
+        """Одинаковое содержимое лежит в одном файле под хешем"""
+        first = self.storage.save('posts/meme.gif', ContentFile(b'meme'))
+        second = self.storage.save('posts/meme.gif', ContentFile(b'meme'))
+        self.assertEqual(first, 'posts/meme.gif')
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.storage.path(first), self.storage.path(second))
+        self.assertRegex(
+            self.storage.url(first),
+            r'^/media/blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
+        self.assertEqual(Blob.objects.get().references, 2)
+        with self.storage.open(second) as file:
+            self.assertEqual(file.read(), b'meme')
+
+    def test_upload_starts_with_write(self):
+        """Загрузка начинает транзакцию с записи счётчика ссылок, чтобы
+        SQLite сразу взял блокировку записи"""
+        self.storage.save('posts/a.gif', ContentFile(b'meme'))
+        with CaptureQueriesContext(connection) as queries:
+            self.storage.save('posts/b.gif', ContentFile(b'meme'))
+        blob_queries = [
+            query['sql'] for query in queries if 'core_blob' in query['sql']
+        ]
+        self.assertEqual(len(blob_queries), 1, blob_queries)
+        self.assertTrue(
+            blob_queries[0].startswith('INSERT INTO core_blob'), blob_queries
+        )
+        self.assertEqual(Blob.objects.get().references, 2)
+
+    def test_blobs_served_as_immutable(self):
+        name = self.storage.save('posts/meme.gif', ContentFile(b'meme'))
+        os.makedirs(f'{self.directory}/posts')
+        with open(f'{self.directory}/posts/old.gif', 'wb') as file:
+            file.write(b'old')
+        request = RequestFactory().get('/media/')
+        cache_control = {
+            path: serve_media(
+                request, path, document_root=self.directory
+            ).get('Cache-Control')
+            for path in (self.storage.url(name)[len('/media/'):],
+                         'posts/old.gif')
+        }
+        self.assertEqual(
+            list(cache_control.values()), [BLOB_CACHE_CONTROL, None]
+        )
+
+    def test_file_removed_with_last_reference(self):
+        first = self.storage.save('posts/a.gif', ContentFile(b'meme'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'meme'))
+        path = self.storage.path(first)
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertTrue(os.path.exists(path))
+        self.storage.delete(second)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_legacy_files_keep_working(self):
+        """Файлы, записанные до хранилища, открываются по своим именам"""
+        os.makedirs(f'{self.directory}/posts')
+        with open(f'{self.directory}/posts/old.gif', 'wb') as file:
+            file.write(b'old')
+        self.assertTrue(self.storage.exists('posts/old.gif'))
+        self.assertEqual(
+            self.storage.url('posts/old.gif'), '/media/posts/old.gif'
+        )
+        self.storage.delete('posts/old.gif')
+        self.assertFalse(os.path.exists(f'{self.directory}/posts/old.gif'))
@@ -1,4 +1,9 @@
+import posixpath
+
 from django.shortcuts import render
+from django.views.static import serve
+
+from .storage import BLOB_CACHE_CONTROL, BLOB_DIR
 
 
 def page_not_found(request, exception):
@@ -15,3 +20,12 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """``django.views.static.serve`` для ``DEBUG``; неизменяемое
+    содержимое из ``blobs/`` браузер кэширует навсегда."""
+    response = serve(request, path, document_root, show_indexes)
+    if posixpath.normpath(path).startswith(BLOB_DIR + '/'):
+        response['Cache-Control'] = BLOB_CACHE_CONTROL
+    return response
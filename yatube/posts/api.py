@@ -0,0 +1,122 @@
+"""JSON-версия лент для мобильного клиента.
+
+Ответ строится из строк ``values()`` только с нужными столбцами
+и отдаётся потоком. Страницы — курсорные: ``?after=`` и ``?before=``
+берутся из полей ``next`` и ``previous`` предыдущего ответа,
+``?limit=`` задаёт размер страницы.
+"""
+import json
+
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from .conditional import (comments_state, conditional, group_state,
+                          index_state, profile_state)
+from .models import Comment, Post
+from .paginators import KeysetPaginator, encode_cursor
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author__username', 'group__slug', 'image',
+    'comment_count',
+)
+COMMENT_FIELDS = ('id', 'author__username', 'text', 'created')
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'comment_count': row['comment_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'author': row['author__username'],
+        'text': row['text'],
+        'created': row['created'].isoformat(),
+    }
+
+
+def _stream(rows, serialize, next_cursor, previous_cursor):
+    yield '{"results": ['
+    for i, row in enumerate(rows):
+        if i:
+            yield ','
+        yield json.dumps(serialize(row), ensure_ascii=False)
+    yield '], "next": {}, "previous": {}}}'.format(
+        json.dumps(next_cursor), json.dumps(previous_cursor)
+    )
+
+
+def page_response(request, queryset, fields, serialize, key,
+                  descending=True):
+    paginator = KeysetPaginator(
+        queryset.values(*fields), get_limit(request), key=key,
+        descending=descending
+    )
+    rows, has_next, has_previous = paginator.fetch(
+        after=request.GET.get('after'), before=request.GET.get('before')
+    )
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1][key], rows[-1]['id'])
+    if rows and has_previous:
+        previous_cursor = encode_cursor(rows[0][key], rows[0]['id'])
+    return StreamingHttpResponse(
+        _stream(rows, serialize, next_cursor, previous_cursor),
+        content_type='application/json'
+    )
+
+
+def post_page(request, queryset):
+    return page_response(
+        request, queryset, POST_FIELDS, serialize_post, 'pub_date'
+    )
+
+
+@require_safe
+@conditional(index_state)
+def index(request):
+    return post_page(request, Post.objects.all())
+
+
+@require_safe
+@conditional(group_state)
+def group_posts(request, slug):
+    return post_page(
+        request, Post.objects.filter(group_id=request.feed_state.pk)
+    )
+
+
+@require_safe
+@conditional(profile_state)
+def profile(request, username):
+    return post_page(
+        request, Post.objects.filter(author_id=request.feed_state.pk)
+    )
+
+
+@require_safe
+@conditional(comments_state)
+def post_comments(request, post_id):
+    return page_response(
+        request, Comment.objects.filter(post_id=post_id).order_by('created'),
+        COMMENT_FIELDS, serialize_comment, 'created', descending=False
+    )
@@ -0,0 +1,179 @@
+"""Досоздание миниатюр для уже загруженных картинок.
+
+После смены размеров в ``settings.POST_THUMBNAILS`` (или переноса
+картинок в новое хранилище) у старых постов нет готовых миниатюр,
+и шаблоны показывают заглушки. ``Backfill`` обходит посты с картинками
+по возрастанию pk пачками и строит недостающие варианты в пуле
+процессов; заодно записывает размеры, формат и заглушку картинок,
+загруженных до того, как их стали сохранять при загрузке.
+
+Пачки отдаются пулу не все сразу, а по мере готовности предыдущих,
+и обрабатываются по порядку, поэтому после каждой пачки можно записать
+в файл контрольной точки её последний pk. Каждый процесс работает
+с пониженным приоритетом ``nice`` и, если задан ``rate``, выдерживает
+паузы, чтобы весь пул читал не больше ``rate`` картинок в секунду.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+
+from django.db import connections
+from django.db.models import F
+from PIL import Image
+
+from . import feed_cache, images, thumbnails
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+Result = namedtuple('Result', 'pk author_id group_id built metadata error')
+
+
+def _init_worker(nice):
+    if nice:
+        os.nice(nice)
+
+
+def _read_metadata(image):
+    with image.open('rb') as file, Image.open(file) as source:
+        return (
+            source.width, source.height, source.format,
+            images.placeholder(source)
+        )
+
+
+def process_batch(rows, interval=0):
+    """Строит миниатюры пачки постов; выполняется в процессе пула."""
+    results = []
+    for pk, name, author_id, group_id, placeholder in rows:
+        started = time.monotonic()
+        image = Post(pk=pk, image=name).image
+        try:
+            variants = thumbnails.missing(image)
+            if variants:
+                thumbnails.build(image, variants)
+            metadata = None if placeholder else _read_metadata(image)
+        except Exception as error:
+            logger.warning('Failed to backfill thumbnails for %s: %s',
+                           name, error)
+            results.append(
+                Result(pk, author_id, group_id, False, None, str(error))
+            )
+        else:
+            results.append(Result(
+                pk, author_id, group_id, bool(variants), metadata, None
+            ))
+        pause = interval - (time.monotonic() - started)
+        if pause > 0:
+            time.sleep(pause)
+    return results
+
+
+class Backfill:
+    """Обходит посты с картинками; ``workers=0`` — без пула процессов."""
+
+    def __init__(self, workers=2, batch_size=50, rate=0, nice=10,
+                 checkpoint=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.rate = rate
+        self.nice = nice
+        self.checkpoint = checkpoint
+        self.counts = {'processed': 0, 'built': 0, 'failed': 0}
+
+    def read_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as file:
+            return int(file.read().strip() or 0)
+
+    def write_checkpoint(self, pk):
+        if not self.checkpoint:
+            return
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(str(pk))
+        os.replace(temporary, self.checkpoint)
+
+    def batches(self, queryset):
+        last_pk = None
+        while True:
+            batch = queryset
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            rows = list(batch.values_list(
+                'pk', 'image', 'author_id', 'group_id', 'image_placeholder'
+            )[:self.batch_size])
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield rows
+
+    def collect(self, results):
+        built = [result for result in results if result.built]
+        if built:
+            Post.objects.filter(
+                pk__in=[result.pk for result in built]
+            ).update(version=F('version') + 1)
+            keys = set()
+            for result in built:
+                keys |= feed_cache.post_keys(
+                    Post(author_id=result.author_id, group_id=result.group_id)
+                )
+            feed_cache.bump(*keys)
+        Post.objects.bulk_update([
+            Post(
+                pk=result.pk,
+                image_width=result.metadata[0],
+                image_height=result.metadata[1],
+                image_format=result.metadata[2],
+                image_placeholder=result.metadata[3],
+            )
+            for result in results if result.metadata
+        ], [
+            'image_width', 'image_height', 'image_format', 'image_placeholder'
+        ])
+        self.counts['processed'] += len(results)
+        self.counts['built'] += len(built)
+        self.counts['failed'] += sum(1 for result in results if result.error)
+        self.write_checkpoint(results[-1].pk)
+
+    def run(self, progress=None):
+        """Возвращает счётчики; ``progress(counts, total)`` вызывается
+        после каждой пачки."""
+        queryset = (
+            Post.objects.exclude(image='')
+            .filter(pk__gt=self.read_checkpoint()).order_by('pk')
+        )
+        total = queryset.count()
+        interval = max(self.workers, 1) / self.rate if self.rate else 0
+
+        def collect(results):
+            self.collect(results)
+            if progress:
+                progress(self.counts, total)
+
+        if not self.workers:
+            for rows in self.batches(queryset):
+                collect(process_batch(rows, interval))
+        else:
+            # Процессы не должны унаследовать открытые соединения.
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(
+                self.workers, _init_worker, (self.nice,)
+            ) as pool:
+                pending = deque()
+                for rows in self.batches(queryset):
+                    pending.append(
+                        pool.apply_async(process_batch, (rows, interval))
+                    )
+                    if len(pending) >= self.workers * 2:
+                        collect(pending.popleft().get())
+                while pending:
+                    collect(pending.popleft().get())
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        return self.counts
@@ -0,0 +1,64 @@
+"""Кэш отрисованных карточек постов.
+
+Карточка зависит только от самого поста, его автора и группы, поэтому
+её HTML кэшируется под ключом из id и ``Post.version``: любое изменение,
+видимое в карточке, увеличивает версию, и старый ключ просто перестаёт
+запрашиваться. Страница ленты получает все свои карточки одним
+``get_many`` и рисует шаблон только для промахов, а их сохраняет одним
+``set_many``. Миниатюры для нарисованных заново карточек тоже ищутся
+всей пачкой (``thumbnails.lookup_many``) и передаются в шаблон готовыми
+в переменной ``thumbnail``.
+
+Карточки результатов поиска не кэшируются: в них выделены найденные
+слова, и они зависят от запроса.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+
+PREFIX = 'post-card'
+
+
+def card_key(template_name, post):
+    return f'{PREFIX}:{template_name}:{post.pk}:{post.version}'
+
+
+def render_cards(posts, template_name, variant=None):
+    """Возвращает HTML карточек постов в их исходном порядке.
+
+    ``variant`` — размер из ``settings.POST_THUMBNAILS`` для картинок.
+    """
+    posts = list(posts)
+    keys = [
+        None if getattr(post, 'snippet', None) else card_key(
+            template_name, post
+        )
+        for post in posts
+    ]
+    cards = cache.get_many([key for key in keys if key])
+    template = get_template(template_name)
+    ready = {}
+    if variant:
+        ready = thumbnails.lookup_many(
+            [post.image for post, key in zip(posts, keys)
+             if key not in cards],
+            variant
+        )
+    rendered = {}
+    result = []
+    for post, key in zip(posts, keys):
+        card = cards.get(key)
+        if card is None:
+            card = template.render({
+                'post': post,
+                'thumbnail': ready.get(post.image.name),
+            })
+            if key:
+                rendered[key] = card
+        result.append(mark_safe(card))
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,171 @@
+"""Валидаторы ``ETag`` и ``Last-Modified`` для лент, постов и комментариев.
+
+Состояние ленты — дата самой свежей записи и поколение ленты из
+``feed_cache``, которое меняется при любой записи, в том числе при
+правке и удалении старых постов. Оно получается одним запросом по
+индексу (плюс чтение из кэша), поэтому повторный опрос без изменений
+стоит один запрос и ответ ``304``.
+
+HTML-страницы зависят ещё и от того, кто их смотрит (меню, кнопки
+подписки и редактирования), поэтому в их ``ETag`` входят пользователь
+и его CSRF-cookie (формы страницы содержат токен, который меняется
+при каждом входе), а ``Last-Modified`` не отдаётся: по одной дате
+браузер мог бы получить ``304`` на страницу, сохранённую до входа
+на сайт.
+"""
+import hashlib
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.http import Http404
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Comment, Group, Post, User
+
+# ``object`` — группа, автор или пост страницы, если он есть.
+FeedState = namedtuple(
+    'FeedState', 'pk last_modified tag object', defaults=(None,)
+)
+
+
+def _newest(queryset, field):
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def index_state(request):
+    last = (
+        Post.objects.order_by('-pub_date')
+        .values_list('pub_date', flat=True).first()
+    )
+    return FeedState(
+        None, last, feed_cache.get_version(feed_cache.index_key())
+    )
+
+
+def group_state(request, slug):
+    group = (
+        Group.objects.filter(slug=slug)
+        .annotate(last=_newest(
+            Post.objects.filter(group=OuterRef('pk')), 'pub_date'
+        ))
+        .first()
+    )
+    if group is None:
+        return None
+    return FeedState(
+        group.pk, group.last,
+        feed_cache.get_version(feed_cache.group_key(group.pk)), group
+    )
+
+
+def profile_state(request, username):
+    author = (
+        User.objects.filter(username=username)
+        .select_related('stats')
+        .annotate(last=_newest(
+            Post.objects.filter(author=OuterRef('pk')), 'pub_date'
+        ))
+        .first()
+    )
+    if author is None:
+        return None
+    stats = getattr(author, 'stats', None)
+    followers, following = (
+        (stats.follower_count, stats.following_count) if stats
+        else (None, None)
+    )
+    version = feed_cache.get_version(feed_cache.author_key(author.pk))
+    return FeedState(
+        author.pk, author.last, f'{version}.{followers}.{following}', author
+    )
+
+
+def profile_page_state(request, username):
+    state = profile_state(request, username)
+    if state is None or not request.user.is_authenticated:
+        return state
+    # Кнопка «подписаться» зависит от подписок смотрящего.
+    following = feed_cache.get_version(
+        feed_cache.follow_key(request.user.pk)
+    )
+    return state._replace(tag=f'{state.tag}.{following}')
+
+
+def post_state(request, post_id):
+    post = (
+        Post.objects.filter(pk=post_id)
+        .select_related('author__stats', 'group')
+        .annotate(last=_newest(
+            Comment.objects.filter(post=OuterRef('pk')), 'created'
+        ))
+        .first()
+    )
+    if post is None:
+        return None
+    # Правка поста, комментарии к нему и переименование комментаторов
+    # сбрасывают поколение автора.
+    version = feed_cache.get_version(feed_cache.author_key(post.author_id))
+    return FeedState(
+        post.pk, post.last, f'{version}.{post.comment_count}', post
+    )
+
+
+def comments_state(request, post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .annotate(last=_newest(
+            Comment.objects.filter(post=OuterRef('pk')), 'created'
+        ))
+        .values_list('pk', 'author_id', 'last', 'comment_count').first()
+    )
+    if row is None:
+        return None
+    pk, author_id, last, count = row
+    version = feed_cache.get_version(feed_cache.author_key(author_id))
+    return FeedState(pk, last, f'{version}.{count}')
+
+
+def make_etag(request, state, *extra):
+    raw = '|'.join((
+        state.tag,
+        state.last_modified.isoformat() if state.last_modified else '',
+        request.get_full_path(),
+        *extra,
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional(state_func, per_user=False):
+    """Отвечает ``304``, если клиент уже видел это состояние ленты.
+
+    Несуществующий объект даёт 404 без вызова представления. Состояние
+    доступно представлению как ``request.feed_state``: из него берутся
+    группа, автор или пост страницы, чтобы не запрашивать их повторно.
+    ``per_user`` — страница своя у каждого пользователя.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            state = state_func(request, *args, **kwargs)
+            if state is None:
+                raise Http404
+            request.feed_state = state
+            if per_user:
+                etag = make_etag(
+                    request, state, str(request.user.pk),
+                    request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+                )
+                last_modified = None
+            else:
+                etag = make_etag(request, state)
+                last_modified = state.last_modified
+            conditional_view = condition(
+                etag_func=lambda *args, **kwargs: etag,
+                last_modified_func=lambda *args, **kwargs: last_modified,
+            )(view)
+            return conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,116 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарно выражениями ``F()`` из сигналов моделей
+``Post``, ``Comment`` и ``Follow``. Расхождения (например, после
+``bulk_create`` или ручных правок в базе) исправляет команда
+``reconcile_counters``.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = {
+    'post_count': (Post, 'author'),
+    'follower_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_of(model, field):
+    """Подзапрос: сколько строк ``model`` ссылаются на текущий объект."""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def _changes(delta, *fields):
+    return {field: Greatest(F(field) + delta, 0) for field in fields}
+
+
+def bump_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        version=F('version') + 1, **_changes(delta, 'comment_count')
+    )
+
+
+def bump_user_counter(user_id, field, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **_changes(delta, field)
+    )
+    if not updated and delta > 0:
+        reconcile_users(User.objects.filter(pk=user_id))
+
+
+def create_user_stats(user):
+    UserStats.objects.get_or_create(user=user)
+
+
+def _batches(queryset, batch_size):
+    last_pk = None
+    queryset = queryset.order_by('pk')
+    while True:
+        batch = queryset
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        yield pks
+
+
+def reconcile_posts(queryset=None, batch_size=1000):
+    """Пересчитывает ``Post.comment_count``; возвращает число правок."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    fixed = 0
+    for pks in _batches(queryset, batch_size):
+        drifted = (
+            Post.objects.filter(pk__in=pks)
+            .annotate(actual=count_of(Comment, 'post'))
+            .exclude(comment_count=F('actual'))
+            .only('pk', 'comment_count', 'version')
+        )
+        posts = []
+        for post in drifted:
+            post.comment_count = post.actual
+            post.version += 1
+            posts.append(post)
+        Post.objects.bulk_update(posts, ['comment_count', 'version'])
+        fixed += len(posts)
+    return fixed
+
+
+def reconcile_users(queryset=None, batch_size=1000):
+    """Пересчитывает ``UserStats`` и создаёт недостающие строки."""
+    if queryset is None:
+        queryset = User.objects.all()
+    fixed = 0
+    for pks in _batches(queryset, batch_size):
+        users = User.objects.filter(pk__in=pks).annotate(**{
+            field: count_of(model, lookup)
+            for field, (model, lookup) in USER_COUNTERS.items()
+        })
+        stats = UserStats.objects.in_bulk(pks)
+        missing, drifted = [], []
+        for user in users:
+            actual = {field: getattr(user, field) for field in USER_COUNTERS}
+            current = stats.get(user.pk)
+            if current is None:
+                missing.append(UserStats(user=user, **actual))
+                continue
+            if any(
+                getattr(current, field) != value
+                for field, value in actual.items()
+            ):
+                for field, value in actual.items():
+                    setattr(current, field, value)
+                drifted.append(current)
+        UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+        UserStats.objects.bulk_update(drifted, list(USER_COUNTERS))
+        fixed += len(missing) + len(drifted)
+    return fixed
@@ -0,0 +1,50 @@
+"""Посты, удаляемые в текущем потоке.
+
+Каскадное удаление комментариев поста не должно по одному запросу
+на комментарий обновлять счётчик и кэш поста, который сейчас исчезнет.
+Посты отмечаются на время удаления в ``deleting``; отметка снимается
+в ``finally``, поэтому неудачное удаление её не оставляет.
+
+Посты удаляемого пользователя Django удаляет каскадом, обёртки вокруг
+этого нет: отметку ставят и снимают сигналы ``User`` через ``mark``
+и ``unmark``. Если удаление упало между ними, отметки сбрасывает
+``reset`` по окончании запроса.
+"""
+import threading
+from contextlib import contextmanager
+
+_state = threading.local()
+
+
+def _marked():
+    if not hasattr(_state, 'posts'):
+        _state.posts = set()
+    return _state.posts
+
+
+def is_deleting(post_id):
+    return post_id in _marked()
+
+
+def mark(post_ids):
+    """Отмечает посты и возвращает те, что отмечены этим вызовом."""
+    marked = set(post_ids) - _marked()
+    _marked().update(marked)
+    return marked
+
+
+def unmark(post_ids):
+    _marked().difference_update(post_ids)
+
+
+def reset():
+    _marked().clear()
+
+
+@contextmanager
+def deleting(post_ids):
+    marked = mark(post_ids)
+    try:
+        yield
+    finally:
+        unmark(marked)
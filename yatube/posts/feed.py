@@ -0,0 +1,127 @@
+"""Материализованная лента подписок.
+
+Новый пост автора раскладывается в таблицу ``FeedEntry`` каждому его
+подписчику (fan-out on write), поэтому страница ``/follow/`` читает
+только собственные записи пользователя по индексу (user, -pub_date).
+Посты авторов, у которых больше ``FEED_FANOUT_MAX_FOLLOWERS``
+подписчиков, не раскладываются, а подмешиваются при чтении. Когда
+после отписки автор опускается до порога, его посты, опубликованные
+за это время, и подписки, на которые не было раскладки, досоздаются
+в лентах всех подписчиков одним запросом.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+
+def is_celebrity(author):
+    return UserStats.objects.filter(
+        user=author,
+        follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).exists()
+
+
+def followed_celebrities(user):
+    return Follow.objects.filter(
+        user=user,
+        author__stats__follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('author', flat=True)
+
+
+def _bulk_create(entries):
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    if is_celebrity(post.author):
+        return
+    followers = (
+        Follow.objects.filter(author=post.author)
+        .values_list('user', flat=True).distinct()
+    )
+    _bulk_create([
+        FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers
+    ])
+
+
+def backfill_follow(user, author):
+    if is_celebrity(author):
+        return
+    posts = (
+        Post.objects.filter(author=author)
+        .values_list('pk', 'pub_date')
+        .iterator(chunk_size=settings.FEED_BATCH_SIZE)
+    )
+    batch = []
+    for post_id, pub_date in posts:
+        batch.append(
+            FeedEntry(user=user, post_id=post_id, pub_date=pub_date)
+        )
+        if len(batch) == settings.FEED_BATCH_SIZE:
+            _bulk_create(batch)
+            batch = []
+    _bulk_create(batch)
+
+
+def materialize_author(author):
+    """Раскладывает все посты автора всем его подписчикам."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {FeedEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT DISTINCT f.user_id, p.id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'WHERE f.author_id = %s',
+            [author.pk]
+        )
+
+
+def trim_follow(user, author):
+    if not Follow.objects.filter(user=user, author=author).exists():
+        FeedEntry.objects.filter(user=user, post__author=author).delete()
+    # Счётчик уже уменьшен: ровно на пороге — автор только что перестал
+    # подмешиваться при чтении.
+    if UserStats.objects.filter(
+        user=author, follower_count=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).exists():
+        materialize_author(author)
+
+
+def rebuild():
+    """Заново раскладывает ленты всех подписчиков одним запросом.
+
+    Нужна после загрузки данных в обход сигналов; счётчики подписчиков
+    к этому моменту должны быть пересчитаны.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        FeedEntry.objects.all().delete()
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT DISTINCT f.user_id, p.id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'JOIN {UserStats._meta.db_table} s ON s.user_id = f.author_id '
+            f'WHERE s.follower_count <= %s',
+            [settings.FEED_FANOUT_MAX_FOLLOWERS]
+        )
+
+
+def get_feed(user):
+    posts = Post.objects.select_related('author', 'group')
+    celebrities = list(followed_celebrities(user))
+    if not celebrities:
+        return (
+            posts.filter(feed_entries__user=user)
+            .order_by('-feed_entries__pub_date')
+        )
+    inbox = FeedEntry.objects.filter(user=user).values('post')
+    return posts.filter(Q(pk__in=inbox) | Q(author__in=celebrities))
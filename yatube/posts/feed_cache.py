@@ -0,0 +1,80 @@
+"""Версии лент для кэширования фрагментов шаблонов.
+
+У каждой ленты (главная, группа, автор, подписки пользователя) есть
+счётчик поколений в кэше. Сигналы записи увеличивают счётчики
+затронутых лент, а ключ закэшированного фрагмента включает текущие
+поколения, поэтому фрагменты можно хранить часами: после изменения
+ленты старый ключ просто перестаёт запрашиваться.
+
+Сигналы записи сбрасывают поколения через ``bump_on_commit``: пока
+транзакция не зафиксирована, другой процесс может прочитать уже новое
+поколение, но из снимка базы со старыми строками, и закэшировать под
+ним устаревший фрагмент. Повторный сброс после фиксации оставляет такие
+фрагменты под ключом, который больше не запрашивается.
+"""
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'feed-generation'
+
+
+def index_key():
+    return f'{PREFIX}:index'
+
+
+def group_key(group_id):
+    return f'{PREFIX}:group:{group_id}'
+
+
+def author_key(author_id):
+    return f'{PREFIX}:author:{author_id}'
+
+
+def follow_key(user_id):
+    return f'{PREFIX}:follow:{user_id}'
+
+
+def post_keys(post, *extra_group_ids):
+    keys = {index_key(), author_key(post.author_id)}
+    for group_id in (post.group_id, *extra_group_ids):
+        if group_id is not None:
+            keys.add(group_key(group_id))
+    return keys
+
+
+def _initial():
+    # Потерянный счётчик начинается со времени, а не с единицы, чтобы
+    # не совпасть с поколением, под которым уже лежат старые фрагменты.
+    return int(time.time() * 1000)
+
+
+def get_version(*keys):
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        for key in missing:
+            cache.add(key, _initial(), None)
+        generations.update(cache.get_many(missing))
+    return '.'.join(str(generations.get(key, 0)) for key in keys)
+
+
+def bump(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def bump_on_commit(*keys):
+    """Сбрасывает поколения сразу и ещё раз после фиксации транзакции.
+
+    Первый сброс видят чтения в той же транзакции, второй — отбрасывает
+    фрагменты, которые успели построить по снимку до фиксации.
+    """
+    bump(*keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(bump, *keys))
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from . import images
 from .models import Comment, Post
 
 
@@ -8,6 +11,27 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        post = self.instance
+        if isinstance(image, UploadedFile):
+            try:
+                ingested = images.ingest(image)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                raise forms.ValidationError(
+                    'Не удалось прочитать картинку: файл повреждён '
+                    'или слишком большой'
+                )
+            post.image_width = ingested.width
+            post.image_height = ingested.height
+            post.image_format = ingested.format
+            post.image_placeholder = ingested.placeholder
+            return ingested.file
+        if not image:
+            post.image_width = post.image_height = None
+            post.image_format = post.image_placeholder = ''
+        return image
+
     def clean_subject(self):
         posted = self.cleaned_data['text']
         if posted == '':
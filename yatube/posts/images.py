@@ -0,0 +1,138 @@
+"""Обработка картинок постов при загрузке.
+
+Загруженный файл открывается Pillow прямо из временного файла загрузки
+и перекодируется в тот же формат: поворот по EXIF применяется к
+пикселям, метаданные (EXIF с координатами, XMP, комментарии)
+отбрасываются, стороны больше ``IMAGE_MAX_SIZE`` уменьшаются.
+Анимированные GIF и WebP перекодируются покадрово с сохранением
+длительности кадров: в WebP тоже бывают EXIF и XMP.
+Результат пишется во временный файл, который держится в памяти, пока
+не превысит ``FILE_UPLOAD_MAX_MEMORY_SIZE``, и сохраняется хранилищем
+по частям.
+
+Ширина, высота и формат записываются в пост, поэтому шаблонам
+и миниатюрам не нужно открывать оригинал ради размеров. Туда же
+пишется заглушка — размытая копия картинки в ``IMAGE_PLACEHOLDER_SIZE``
+пикселей, закодированная в data URI из нескольких сотен байт: шаблоны
+показывают её фоном, пока миниатюра лениво загружается.
+"""
+import base64
+import io
+import os
+import tempfile
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageFilter, ImageOps, ImageSequence
+
+IngestedImage = namedtuple(
+    'IngestedImage', 'file width height format placeholder'
+)
+
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'method': 4},
+}
+# Что нужно кадрам анимации для отрисовки, остальное отбрасывается.
+FRAME_INFO = ('transparency', 'background', 'disposal', 'blend')
+# Форматы, которые показывают браузеры; остальные перекодируются в PNG.
+EXTENSIONS = {
+    'JPEG': ('.jpg', '.jpeg', '.jpe'),
+    'PNG': ('.png',),
+    'GIF': ('.gif',),
+    'WEBP': ('.webp',),
+}
+
+
+def _target_format(source_format):
+    return source_format if source_format in EXTENSIONS else 'PNG'
+
+
+def _name(name, image_format):
+    root, extension = os.path.splitext(name)
+    if extension.lower() in EXTENSIONS[image_format]:
+        return name
+    return root + EXTENSIONS[image_format][0]
+
+
+def _prepare(image, image_format):
+    max_size = settings.IMAGE_MAX_SIZE
+    if image_format == 'JPEG':
+        # Декодирует JPEG сразу в уменьшенном в 2-8 раз масштабе.
+        image.draft(image.mode, (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    return image
+
+
+def placeholder(image):
+    """Возвращает заглушку картинки как data URI; картинка уменьшается
+    на месте."""
+    size = settings.IMAGE_PLACEHOLDER_SIZE
+    image.thumbnail((size, size))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=40, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        output.getvalue()
+    ).decode()
+
+
+def _save_animated(image, image_format, output):
+    max_size = settings.IMAGE_MAX_SIZE
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = ImageOps.exif_transpose(frame)
+        # Pillow дописывает в анимацию всё из ``info`` кадров,
+        # в том числе комментарии и EXIF.
+        frame.info = {
+            key: value for key, value in frame.info.items()
+            if key in FRAME_INFO
+        }
+        frame.thumbnail((max_size, max_size), Image.LANCZOS)
+        frames.append(frame)
+    first, *rest = frames
+    first.save(
+        output, image_format, save_all=True, append_images=rest,
+        duration=durations, loop=image.info.get('loop', 0),
+        **SAVE_OPTIONS.get(image_format, {})
+    )
+    return first
+
+
+def ingest(upload):
+    """Перекодирует загруженную картинку; возвращает ``IngestedImage``.
+
+    Битый или слишком большой файл приводит к ``OSError``, ``ValueError``
+    или ``Image.DecompressionBombError``.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = _target_format(image.format)
+        output = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        if getattr(image, 'is_animated', False):
+            image = _save_animated(image, image_format, output)
+        else:
+            icc_profile = image.info.get('icc_profile')
+            image = _prepare(image, image_format)
+            options = dict(SAVE_OPTIONS.get(image_format, {}))
+            if image_format in ('JPEG', 'WEBP'):
+                options['quality'] = settings.IMAGE_QUALITY
+            if icc_profile:
+                options['icc_profile'] = icc_profile
+            image.save(output, image_format, **options)
+        width, height = image.size
+        blurred = placeholder(image)
+    output.seek(0)
+    return IngestedImage(
+        File(output, name=_name(upload.name, image_format)),
+        width, height, image_format, blurred
+    )
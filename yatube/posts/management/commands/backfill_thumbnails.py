@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.backfill import Backfill
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие миниатюры всех картинок постов '
+        'в пуле процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 — всё в текущем процессе'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Сколько картинок отдавать процессу за раз'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду на весь пул; '
+                 '0 — без ограничения'
+        )
+        parser.add_argument(
+            '--nice', type=int, default=10,
+            help='Насколько понизить приоритет процессов пула'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с pk последнего обработанного поста: '
+                 'при повторном запуске обход продолжится с него'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(counts, total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{counts["processed"]}/{total}, '
+                f'{counts["processed"] / elapsed:.1f} в секунду, '
+                f'построено: {counts["built"]}, ошибок: {counts["failed"]}'
+            )
+
+        counts = Backfill(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            nice=options['nice'],
+            checkpoint=options['checkpoint'],
+        ).run(progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {counts["processed"]}, '
+            f'построено миниатюр: {counts["built"]}, '
+            f'ошибок: {counts["failed"]}'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл для выгрузки; .gz сжимается, - пишет в stdout'
+        )
+        parser.add_argument(
+            '--model', action='append', dest='models',
+            choices=transfer.MODELS,
+            help='Выгрузить только эти модели'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        with transfer.open_stream(options['path'], 'w') as stream:
+            counts = transfer.export(
+                stream,
+                models=options['models'] or transfer.MODELS,
+                chunk_size=options['chunk_size'],
+            )
+        self.stderr.write(
+            'Выгружено: '
+            + ', '.join(f'{model} {count}' for model, count in counts.items())
+        )
@@ -0,0 +1,82 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters, feed, transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии и подписки из NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл выгрузки; .gz распаковывается, - читает stdin'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк записывать за одну транзакцию'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с номером последней загруженной строки: '
+                 'при повторном запуске загрузка продолжится с неё'
+        )
+        parser.add_argument(
+            '--remap', action='append', default=[], metavar='OLD=NEW',
+            help='Заменить имя пользователя из файла на имя в базе'
+        )
+        parser.add_argument(
+            '--remap-file',
+            help='JSON-объект {"старое имя": "новое"}'
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать недостающих пользователей без пароля'
+        )
+        parser.add_argument(
+            '--id-offset', type=int, default=0,
+            help='Прибавить к id постов и комментариев'
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счётчики и ленты после загрузки'
+        )
+
+    def get_remap(self, options):
+        remap = {}
+        if options['remap_file']:
+            with open(options['remap_file']) as file:
+                remap.update(json.load(file))
+        for item in options['remap']:
+            old, sep, new = item.partition('=')
+            if not sep:
+                raise CommandError(f'--remap ожидает OLD=NEW, получено {item}')
+            remap[old] = new
+        return remap
+
+    def handle(self, *args, **options):
+        importer = transfer.Importer(
+            batch_size=options['batch_size'],
+            remap=self.get_remap(options),
+            create_users=options['create_users'],
+            id_offset=options['id_offset'],
+            checkpoint=options['checkpoint'],
+        )
+        with transfer.open_stream(options['path'], 'r') as stream:
+            counts = importer.run(stream)
+        for model, count in counts.items():
+            self.stdout.write(
+                f'{model}: загружено {count["loaded"]}, '
+                f'пропущено {count["skipped"]}'
+            )
+        if options['no_rebuild']:
+            return
+        # bulk_create обходит сигналы: счётчики, ленты и кэш страниц
+        # приводятся в порядок одним проходом после загрузки.
+        counters.reconcile_posts(batch_size=options['batch_size'])
+        counters.reconcile_users(batch_size=options['batch_size'])
+        feed.rebuild()
+        cache.clear()
+        self.stdout.write('Счётчики и ленты пересчитаны')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов индексировать за одну транзакцию'
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stderr.write('Полнотекстовый индекс требует SQLite с FTS5')
+            return
+        batch_size = options['batch_size']
+        search.clear_index()
+        posts = Post.objects.only('pk', 'text').order_by('pk')
+        batch, total = [], 0
+        for post in posts.iterator(chunk_size=batch_size):
+            batch.append(post)
+            if len(batch) == batch_size:
+                total += self._flush(batch)
+        total += self._flush(batch)
+        self.stdout.write(f'Проиндексировано постов: {total}')
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            search.index_posts(batch)
+        count = len(batch)
+        batch.clear()
+        return count
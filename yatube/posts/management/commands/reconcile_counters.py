@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Исправляет расхождения в счётчиках постов, комментариев и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = counters.reconcile_posts(batch_size=batch_size)
+        users = counters.reconcile_users(batch_size=batch_size)
+        self.stdout.write(
+            f'Исправлено постов: {posts}, пользователей: {users}'
+        )
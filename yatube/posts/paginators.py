@@ -0,0 +1,124 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(value, pk):
+    """Упаковывает пару (значение ключа, pk) в непрозрачный токен."""
+    raw = f'{value.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        value, pk = urlsafe_base64_decode(token).decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации.
+
+    Запрос к базе выполняется при первом обращении к содержимому
+    страницы, поэтому закэшированный шаблон не платит за выборку.
+    """
+    is_keyset = True
+
+    def __init__(self, paginator, after=None, before=None):
+        self.paginator = paginator
+        self.number = None
+        self._after = after
+        self._before = before
+        self._loaded = None
+
+    def _load(self):
+        if self._loaded is None:
+            self._loaded = self.paginator.fetch(self._after, self._before)
+        return self._loaded
+
+    @property
+    def object_list(self):
+        return self._load()[0]
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self._load()[1]
+
+    def has_previous(self):
+        return self._load()[2]
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.paginator.key), obj.pk)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self._cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self._cursor(self.object_list[0])
+
+
+class KeysetPaginator(Paginator):
+    """Пагинация по курсору (key, pk) без COUNT(*) и OFFSET.
+
+    Стоимость выборки страницы не зависит от её глубины: каждая страница —
+    это один запрос ``WHERE (key, pk) < cursor ORDER BY key, pk LIMIT n+1``.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date',
+                 descending=True):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.descending = descending
+
+    def _window(self, cursor, forward):
+        descending = self.descending == forward
+        queryset = self.object_list
+        if cursor is not None:
+            value, pk = cursor
+            lookup = 'lt' if descending else 'gt'
+            # (key, pk) < (value, pk) в виде, понятном планировщику:
+            # диапазон по key использует индекс, а OR только фильтрует.
+            queryset = queryset.filter(
+                Q(**{f'{self.key}__{lookup}e': value}),
+                Q(**{f'{self.key}__{lookup}': value})
+                | Q(**{f'pk__{lookup}': pk})
+            )
+        prefix = '-' if descending else ''
+        return list(
+            queryset.order_by(prefix + self.key, prefix + 'pk')
+            [:self.per_page + 1]
+        )
+
+    def fetch(self, after=None, before=None):
+        """Возвращает (объекты, есть ли следующая, есть ли предыдущая)."""
+        before = decode_cursor(before)
+        if before is not None:
+            rows = self._window(before, forward=False)
+            if rows:
+                has_previous = len(rows) > self.per_page
+                return rows[:self.per_page][::-1], True, has_previous
+        after = decode_cursor(after)
+        rows = self._window(after, forward=True)
+        has_next = len(rows) > self.per_page
+        return rows[:self.per_page], has_next, after is not None
+
+    def get_keyset_page(self, after=None, before=None):
+        return KeysetPage(self, after, before)
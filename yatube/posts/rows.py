@@ -0,0 +1,185 @@
+"""Лёгкие строки постов для лент.
+
+Карточке поста в ленте нужны только текст, дата, имя картинки, число
+комментариев, имя автора и название группы. ``post_rows`` выбирает
+ровно эти столбцы одним запросом с JOIN и отдаёт их не моделями,
+а объектами со ``__slots__``: без ``__dict__``, состояния модели
+и кэша связанных объектов. Шаблоны обращаются к ним так же, как
+к ``Post``: ``post.author.username``, ``post.group.slug``,
+``post.image.url``.
+
+Строка равна модели с тем же pk, поэтому её можно сравнивать
+с ``Post``, ``User`` и ``Group`` и искать в списках постов.
+"""
+from .models import Group, Post, User
+
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'image_placeholder', 'comment_count',
+    'version', 'author_id', 'author__username', 'author__first_name',
+    'author__last_name',
+    'group_id', 'group__title', 'group__slug',
+)
+
+
+class Row:
+    __slots__ = ()
+    model = None
+
+    @property
+    def id(self):
+        return self.pk
+
+    def __eq__(self, other):
+        if not isinstance(other, (type(self), self.model)):
+            return NotImplemented
+        return self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+class AuthorRow(Row):
+    __slots__ = ('pk', 'username', 'first_name', 'last_name')
+    model = User
+
+    def __init__(self, pk, username, first_name, last_name):
+        self.pk = pk
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+    def __str__(self):
+        return self.username
+
+
+class GroupRow(Row):
+    __slots__ = ('pk', 'title', 'slug')
+    model = Group
+
+    def __init__(self, pk, title, slug):
+        self.pk = pk
+        self.title = title
+        self.slug = slug
+
+    def __str__(self):
+        return self.title
+
+
+class PostRow(Row):
+    __slots__ = (
+        'pk', 'text', 'pub_date', 'image_name', 'image_placeholder',
+        'comment_count', 'version', 'author', 'group', 'snippet',
+    )
+    model = Post
+    image_field = Post._meta.get_field('image')
+
+    def __init__(self, pk, text, pub_date, image_name, image_placeholder,
+                 comment_count, version, author, group):
+        self.pk = pk
+        self.text = text
+        self.pub_date = pub_date
+        self.image_name = image_name
+        self.image_placeholder = image_placeholder
+        self.comment_count = comment_count
+        self.version = version
+        self.author = author
+        self.group = group
+        self.snippet = None
+
+    @property
+    def author_id(self):
+        return self.author.pk
+
+    @property
+    def group_id(self):
+        return self.group.pk if self.group else None
+
+    @property
+    def image(self):
+        # Файл создаётся только для карточек, которые его показывают.
+        return self.image_field.attr_class(
+            None, self.image_field, self.image_name
+        )
+
+    def __str__(self):
+        return self.text[:15]
+
+    @classmethod
+    def from_db(cls, row):
+        (pk, text, pub_date, image, placeholder, comment_count, version,
+         author_id, username, first_name, last_name,
+         group_id, title, slug) = row
+        return cls(
+            pk, text, pub_date, image, placeholder, comment_count, version,
+            AuthorRow(author_id, username, first_name, last_name),
+            GroupRow(group_id, title, slug) if group_id else None,
+        )
+
+
+class PostRows:
+    """Выборка постов, которая отдаёт ``PostRow``.
+
+    Оборачивает ``QuerySet`` и поддерживает то, что нужно пагинаторам
+    и поиску: ``filter``, ``order_by``, срезы, ``count`` и ``in_bulk``.
+    Строки читаются через ``values_list(*POST_FIELDS)``, а результат,
+    как у ``QuerySet``, запоминается после первого чтения.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._result = None
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def filter(self, *args, **kwargs):
+        return PostRows(self.queryset.filter(*args, **kwargs))
+
+    def order_by(self, *fields):
+        return PostRows(self.queryset.order_by(*fields))
+
+    def count(self):
+        if self._result is not None:
+            return len(self._result)
+        return self.queryset.count()
+
+    def in_bulk(self, ids):
+        return {
+            row.pk: row for row in self.filter(pk__in=ids).order_by()
+        }
+
+    def _fetch(self):
+        if self._result is None:
+            self._result = [
+                PostRow.from_db(row)
+                for row in self.queryset.values_list(*POST_FIELDS)
+            ]
+        return self._result
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __getitem__(self, key):
+        if self._result is not None:
+            return self._result[key]
+        if isinstance(key, slice):
+            return PostRows(self.queryset[key])
+        return PostRow.from_db(
+            self.queryset.values_list(*POST_FIELDS)[key]
+        )
+
+
+def post_rows(queryset):
+    """Превращает выборку постов в выборку ``PostRow``.
+
+    Результат можно фильтровать, сортировать и отдавать в пагинаторы,
+    каждая копия тоже выдаёт ``PostRow``.
+    """
+    return PostRows(queryset)
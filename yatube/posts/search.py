@@ -0,0 +1,161 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст поста хранится в теневой таблице ``posts_post_fts`` в виде основ
+слов (см. ``posts.stemmer``), rowid строки совпадает с id поста. Таблица
+обновляется сигналами модели ``Post`` и заполняется командой
+``rebuild_search_index``.
+"""
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .stemmer import WORD_RE, stem, stem_words
+
+FTS_TABLE = 'posts_post_fts'
+SNIPPET_WORDS = 30
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_document(text):
+    return ' '.join(stem_words(text))
+
+
+def index_posts(posts):
+    """Добавляет или обновляет посты в индексе одним пакетом."""
+    if not is_available():
+        return
+    rows = [(post.pk, index_document(post.text)) for post in posts]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk, _ in rows]
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)', rows
+        )
+
+
+def unindex_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def clear_index():
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+
+def build_match(query):
+    """Собирает выражение MATCH: все основы слов запроса через AND."""
+    stems = stem_words(query)
+    return ' '.join('"{}"'.format(part.replace('"', '""')) for part in stems)
+
+
+def make_snippet(text, stems):
+    """Вырезает фрагмент текста вокруг первого совпадения и выделяет
+    найденные слова тегом <mark>."""
+    words = [
+        (match.start(), match.end(), stem(match.group()))
+        for match in WORD_RE.finditer(text)
+    ]
+    hits = [i for i, (_, _, word) in enumerate(words) if word in stems]
+    if not hits:
+        return None
+    first = max(hits[0] - SNIPPET_WORDS // 3, 0)
+    last = min(first + SNIPPET_WORDS, len(words)) - 1
+    parts = ['…'] if first else []
+    position = words[first][0]
+    for start, end, word in words[first:last + 1]:
+        parts.append(escape(text[position:start]))
+        fragment = escape(text[start:end])
+        if word in stems:
+            fragment = f'<mark>{fragment}</mark>'
+        parts.append(fragment)
+        position = end
+    if last < len(words) - 1:
+        parts.append('…')
+    return mark_safe(''.join(parts))
+
+
+class SearchResults:
+    """Ленивый список найденных постов, упорядоченный по релевантности.
+
+    Поддерживает ``count()`` и срезы, поэтому его можно отдавать
+    в ``Paginator``: каждая страница — один запрос к FTS5 с LIMIT/OFFSET
+    и одна выборка постов по id.
+    """
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.match = build_match(query)
+        self.stems = set(stem_words(query))
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                        f'WHERE {FTS_TABLE} MATCH %s',
+                        [self.match]
+                    )
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _fetch(self, offset, limit):
+        if not self.match or limit <= 0:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                # rowid различает посты с равным рангом, иначе при
+                # постраничном выводе они повторяются или теряются.
+                'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [self.match, limit, offset]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        results = []
+        for pk in ids:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.snippet = make_snippet(post.text, self.stems)
+            results.append(post)
+        return results
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            stop = self.count() if key.stop is None else key.stop
+            return self._fetch(start, stop - start)
+        results = self._fetch(key, 1)
+        if not results:
+            raise IndexError(key)
+        return results[0]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def search_posts(queryset, query):
+    if not is_available():
+        return queryset.filter(text__icontains=query)
+    return SearchResults(queryset, query)
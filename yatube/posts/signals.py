@@ -0,0 +1,246 @@
+from functools import partial
+
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, deletion, feed, feed_cache, search
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        counters.create_user_stats(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user_counter(instance.author_id, 'post_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_user_counter(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if deletion.is_deleting(instance.post_id):
+        return
+    counters.bump_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user_counter(instance.author_id, 'follower_count', 1)
+        counters.bump_user_counter(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_user_counter(instance.author_id, 'follower_count', -1)
+    counters.bump_user_counter(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill_follow(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    feed.trim_follow(instance.user, instance.author)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_values(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, '')
+        )
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post_feeds(sender, instance, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    feed_cache.bump_on_commit(
+        *feed_cache.post_keys(instance, previous_group_id)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_on_commit(*feed_cache.post_keys(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post_feeds(sender, instance, **kwargs):
+    if deletion.is_deleting(instance.post_id):
+        return
+    post = Post.objects.only('author', 'group').filter(
+        pk=instance.post_id
+    ).first()
+    if post is not None:
+        feed_cache.bump_on_commit(*feed_cache.post_keys(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    feed_cache.bump_on_commit(feed_cache.follow_key(instance.user_id))
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    # Счётчик увеличивается в базе, а не в загруженном объекте: устаревший
+    # экземпляр иначе записал бы уже использованную версию, и под ней
+    # осталась бы старая карточка. UPDATE заодно берёт блокировку записи.
+    if instance.pk is None:
+        return
+    if Post.objects.filter(pk=instance.pk).update(version=F('version') + 1):
+        instance.refresh_from_db(fields=['version'])
+
+
+def _bump_author_feeds(author_ids, *keys):
+    # Карточки показывают автора и группу, поэтому устаревают все ленты,
+    # где есть посты этих авторов: главная, профили и подписки.
+    follower_ids = Follow.objects.filter(
+        author__in=author_ids
+    ).values_list('user_id', flat=True).distinct()
+    feed_cache.bump_on_commit(
+        feed_cache.index_key(), *keys,
+        *(feed_cache.author_key(author_id) for author_id in author_ids),
+        *(feed_cache.follow_key(user_id) for user_id in follower_ids)
+    )
+
+
+@receiver(post_save, sender=Group)
+def bump_group_post_versions(sender, instance, created, **kwargs):
+    if created:
+        return
+    instance.posts.update(version=F('version') + 1)
+    _bump_author_feeds(
+        list(instance.posts.order_by().values_list(
+            'author_id', flat=True
+        ).distinct()),
+        feed_cache.group_key(instance.pk)
+    )
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # Посты отвязываются от группы одним UPDATE без сигналов Post,
+    # после него их уже не найти.
+    posts = instance.posts.order_by()
+    instance._post_ids = list(posts.values_list('pk', flat=True))
+    instance._author_ids = list(
+        posts.values_list('author_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Group)
+def bump_deleted_group_post_versions(sender, instance, **kwargs):
+    Post.objects.filter(pk__in=instance._post_ids).update(
+        version=F('version') + 1
+    )
+    _bump_author_feeds(
+        instance._author_ids, feed_cache.group_key(instance.pk)
+    )
+
+
+@receiver(pre_delete, sender=User)
+def mark_deleted_user_posts(sender, instance, **kwargs):
+    # Посты и комментарии к ним удаляются каскадом вместе с автором.
+    instance._deleting_post_ids = deletion.mark(
+        instance.posts.order_by().values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def unmark_deleted_user_posts(sender, instance, **kwargs):
+    deletion.unmark(instance._deleting_post_ids)
+
+
+@receiver(request_finished)
+def reset_deletion_marks(sender, **kwargs):
+    deletion.reset()
+
+
+@receiver(post_save, sender=User)
+def bump_author_post_versions(sender, instance, created, update_fields,
+                              **kwargs):
+    # Вход на сайт сохраняет только last_login: карточки не меняются.
+    if created or update_fields and not (
+        {'username', 'first_name', 'last_name'} & set(update_fields)
+    ):
+        return
+    instance.posts.update(version=F('version') + 1)
+    group_ids = instance.posts.order_by().exclude(group=None).values_list(
+        'group_id', flat=True
+    ).distinct()
+    # Страницы постов и их комментарии показывают имена комментаторов,
+    # а их ETag зависит от поколения автора поста, см. conditional.py.
+    commented_author_ids = Post.objects.filter(
+        comments__author=instance
+    ).order_by().values_list('author_id', flat=True).distinct()
+    _bump_author_feeds(
+        [instance.pk],
+        *(feed_cache.group_key(group_id) for group_id in group_ids),
+        *(feed_cache.author_key(author_id)
+          for author_id in commented_author_ids)
+    )
+
+
+def _release_image(storage, name):
+    # Файл может быть общим с другими постами: хранилище только
+    # уменьшает счётчик ссылок, см. core/storage.py. Файлы в обычном
+    # хранилище, как и раньше, не удаляются.
+    release = getattr(storage, 'release', None)
+    if release is not None:
+        transaction.on_commit(partial(release, name))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    if previous and previous != instance.image.name:
+        _release_image(instance.image.storage, previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        _release_image(instance.image.storage, instance.image.name)
@@ -0,0 +1,135 @@
+"""Стеммер русского языка по алгоритму Snowball (Porter).
+
+https://snowballstem.org/algorithms/russian/stemmer.html
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = (
+    (),
+    ('ся', 'сь'),
+)
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Возвращает начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _remove(word, groups):
+    """Отрезает самое длинное окончание из групп.
+
+    Окончания первой группы отрезаются, только если перед ними стоит
+    «а» или «я». Возвращает None, если подходящего окончания нет.
+    """
+    longest, group_one = '', False
+    for index, endings in enumerate(groups):
+        for ending in endings:
+            if word.endswith(ending) and len(ending) > len(longest):
+                longest, group_one = ending, index == 0
+    if not longest:
+        return None
+    stem = word[:-len(longest)]
+    if group_one and not stem.endswith(('а', 'я')):
+        return None
+    return stem
+
+
+def _remove_adjectival(word):
+    stem = _remove(word, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _remove(stem, PARTICIPLE)
+    return stem if participle is None else participle
+
+
+def _step_one(rest):
+    stemmed = _remove(rest, PERFECTIVE_GERUND)
+    if stemmed is not None:
+        return stemmed
+    reflexive = _remove(rest, REFLEXIVE)
+    if reflexive is not None:
+        rest = reflexive
+    for remover in (
+        _remove_adjectival,
+        lambda part: _remove(part, VERB),
+        lambda part: _remove(part, NOUN),
+    ):
+        stemmed = remover(rest)
+        if stemmed is not None:
+            return stemmed
+    return rest
+
+
+def _step_four(rest):
+    if rest.endswith('нн'):
+        return rest[:-1]
+    for ending in SUPERLATIVE:
+        if rest.endswith(ending):
+            rest = rest[:-len(ending)]
+            return rest[:-1] if rest.endswith('нн') else rest
+    return rest[:-1] if rest.endswith('ь') else rest
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    prefix, rest = word[:rv], word[rv:]
+    rest = _step_one(rest)
+    if rest.endswith('и'):
+        rest = rest[:-1]
+    for ending in DERIVATIONAL:
+        if rest.endswith(ending) and rv + len(rest) - len(ending) >= r2:
+            rest = rest[:-len(ending)]
+            break
+    return prefix + _step_four(rest)
+
+
+def stem_words(text):
+    return [stem(word) for word in WORD_RE.findall(text)]
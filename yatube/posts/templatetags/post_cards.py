@@ -0,0 +1,10 @@
+from django import template
+
+from .. import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, template_name, variant=None):
+    return cards.render_cards(posts, template_name, variant)
@@ -0,0 +1,45 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, variant):
+    if not image:
+        return None
+    return thumbnails.lookup_many([image], variant)[image.name]
+
+
+@register.simple_tag
+def picture(thumbnail, width=None, sizes=None, css_class='',
+            placeholder='', loading='lazy'):
+    """``<picture>`` с srcset всех готовых размеров миниатюры.
+
+    ``width`` — ширина на странице; высота считается по пропорциям
+    миниатюры, чтобы место под картинку было известно до загрузки.
+    По умолчанию картинка грузится лениво, а до загрузки на её месте
+    растянута размытая заглушка ``placeholder``.
+    """
+    if width is None:
+        sizes = sizes or '100vw'
+        width, height = thumbnail.width, thumbnail.height
+    else:
+        sizes = sizes or f'{width}px'
+        height = round(thumbnail.height * width / thumbnail.width)
+    style = format_html(
+        ' style="background: center / cover no-repeat url({})"', placeholder
+    ) if placeholder else ''
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" loading="{}" decoding="async"{} alt="">'
+        '</picture>',
+        format_html_join(
+            '', '<source type="{}" srcset="{}" sizes="{}">',
+            ((mime, srcset, sizes) for mime, srcset in thumbnail.sources())
+        ),
+        css_class, thumbnail.url, thumbnail.srcset(), sizes, width, height,
+        loading, style
+    )
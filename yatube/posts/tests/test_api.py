@@ -0,0 +1,123 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+AUTHOR = 'author'
+GROUP_SLUG = 'the_group'
+TEST_TEXT = 'Тестовый текст поста'
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=GROUP_SLUG,
+            description='Описание группы'
+        )
+        for i in range(5):
+            Post.objects.create(
+                text=f'{TEST_TEXT} {i}', author=cls.author, group=cls.group
+            )
+        cls.post = Post.objects.first()
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def get_json(self, url, data=None, **headers):
+        response = self.client.get(url, data, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, json.loads(b''.join(response.streaming_content))
+
+    def test_feeds(self):
+        """Ленты отдают посты с нужными полями"""
+        urls = [
+            reverse('api_v1:index'),
+            reverse('api_v1:group_list', kwargs={'slug': GROUP_SLUG}),
+            reverse('api_v1:profile', kwargs={'username': AUTHOR}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                _, data = self.get_json(url)
+                self.assertEqual(len(data['results']), 5)
+                first = data['results'][0]
+                self.assertEqual(first['id'], self.post.pk)
+                self.assertEqual(first['author'], AUTHOR)
+                self.assertEqual(first['group'], GROUP_SLUG)
+                self.assertEqual(first['comment_count'], 3)
+                self.assertIsNone(first['image'])
+
+    def test_cursor_pagination(self):
+        """Курсор next ведёт на следующую страницу"""
+        url = reverse('api_v1:index')
+        _, first = self.get_json(url, {'limit': 3})
+        _, second = self.get_json(url, {'limit': 3, 'after': first['next']})
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.values_list('pk', flat=True))
+        )
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_comments(self):
+        """Комментарии идут от старых к новым"""
+        _, data = self.get_json(
+            reverse('api_v1:post_comments', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(
+            [row['text'] for row in data['results']],
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2']
+        )
+
+    def test_not_modified(self):
+        """Неизменившаяся лента — один запрос и ответ 304"""
+        url = reverse('api_v1:group_list', kwargs={'slug': GROUP_SLUG})
+        response, _ = self.get_json(url)
+        with self.assertNumQueries(1):
+            cached = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(cached.status_code, 304)
+        cached = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    def test_changes_update_etag(self):
+        """Правка и новый комментарий меняют ETag"""
+        url = reverse('api_v1:index')
+        etag = self.get_json(url)[0]['ETag']
+        post = Post.objects.last()
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        comments_url = reverse(
+            'api_v1:post_comments', kwargs={'post_id': self.post.pk}
+        )
+        etag = self.get_json(comments_url)[0]['ETag']
+        Comment.objects.create(post=self.post, author=self.author, text='Ещё')
+        response = self.client.get(comments_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_objects(self):
+        urls = [
+            reverse('api_v1:group_list', kwargs={'slug': 'missing'}),
+            reverse('api_v1:profile', kwargs={'username': 'missing'}),
+            reverse('api_v1:post_comments', kwargs={'post_id': 0}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
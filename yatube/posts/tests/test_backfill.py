@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import thumbnails
+from ..backfill import Backfill
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        # Посты созданы в обход формы: миниатюр и размеров у них нет.
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author,
+                image=SimpleUploadedFile(f'old{i}.gif', IMAGE)
+            )
+            for i in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.checkpoint = os.path.join(self.directory, 'checkpoint')
+
+    def test_builds_missing_thumbnails_and_metadata(self):
+        """Обход строит все варианты и записывает размеры и заглушки"""
+        counts = Backfill(workers=0, batch_size=2).run()
+        self.assertEqual(counts, {'processed': 3, 'built': 3, 'failed': 0})
+        for post in Post.objects.all():
+            with self.subTest(post=post.pk):
+                self.assertEqual(thumbnails.missing(post.image), [])
+                self.assertEqual(
+                    (post.image_width, post.image_height, post.image_format),
+                    (2, 1, 'GIF')
+                )
+                self.assertTrue(post.image_placeholder.startswith(
+                    'data:image/jpeg;base64,'
+                ))
+                self.assertEqual(post.version, 1)
+        counts = Backfill(workers=0).run()
+        self.assertEqual(counts['built'], 0)
+
+    def test_resumes_from_checkpoint(self):
+        """Повторный запуск продолжает с последней готовой пачки"""
+        with open(self.checkpoint, 'w') as file:
+            file.write(str(self.posts[0].pk))
+        progress = []
+        counts = Backfill(
+            workers=0, batch_size=1, checkpoint=self.checkpoint
+        ).run(lambda counts, total: progress.append(
+            (counts['processed'], total)
+        ))
+        self.assertEqual(counts['processed'], 2)
+        self.assertEqual(progress, [(1, 2), (2, 2)])
+        self.assertNotEqual(thumbnails.missing(self.posts[0].image), [])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_missing_file_is_reported(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(image='posts/gone.gif')
+        output = StringIO()
+        call_command('backfill_thumbnails', workers=0, stdout=output)
+        self.assertIn('ошибок: 1', output.getvalue())
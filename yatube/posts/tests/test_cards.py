@@ -0,0 +1,138 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..cards import render_cards
+from ..models import Comment, Follow, Group, Post, User
+from ..rows import post_rows
+
+CARD = 'posts/includes/card.html'
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='the_group', description='Описание'
+        )
+        for i in range(3):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def rows(self):
+        return list(post_rows(Post.objects.all()))
+
+    def version(self, post):
+        return Post.objects.values_list('version', flat=True).get(pk=post.pk)
+
+    def test_warm_cards_skip_rendering(self):
+        """Тёплые карточки берутся из кэша без отрисовки шаблона"""
+        cold = render_cards(self.rows(), CARD)
+        with mock.patch('posts.cards.get_template') as get_template:
+            warm = render_cards(self.rows(), CARD)
+        get_template.return_value.render.assert_not_called()
+        self.assertEqual(warm, cold)
+
+    def test_only_changed_card_is_rendered(self):
+        """После правки поста заново рисуется только его карточка"""
+        render_cards(self.rows(), CARD)
+        post = Post.objects.first()
+        post.text = 'Исправленный текст'
+        post.save()
+        with mock.patch('posts.cards.get_template') as get_template:
+            get_template.return_value.render.return_value = 'новая'
+            cards = render_cards(self.rows(), CARD)
+        get_template.return_value.render.assert_called_once()
+        self.assertEqual(cards[0], 'новая')
+
+    def test_version_changes_with_card_contents(self):
+        """Версия поста растёт при любом изменении его карточки"""
+        post = Post.objects.first()
+        changes = {
+            'правка': lambda: Post.objects.get(pk=post.pk).save(),
+            'комментарий': lambda: Comment.objects.create(
+                post=post, author=self.author, text='Комментарий'
+            ),
+            'группа': lambda: Group.objects.get(pk=self.group.pk).save(),
+            'автор': lambda: User.objects.get(pk=self.author.pk).save(),
+        }
+        for change, make in changes.items():
+            with self.subTest(change=change):
+                before = self.version(post)
+                make()
+                self.assertGreater(self.version(post), before)
+
+    def test_stale_instance_gets_new_version(self):
+        """Сохранение устаревшего объекта не повторяет старую версию"""
+        post = Post.objects.first()
+        stale = Post.objects.get(pk=post.pk)
+        post.save()
+        used = self.version(post)
+        stale.save()
+        self.assertGreater(stale.version, used)
+        self.assertEqual(self.version(post), stale.version)
+
+    def test_login_keeps_versions(self):
+        """Вход автора на сайт не сбрасывает кэш его карточек"""
+        self.author.set_password('password')
+        self.author.save()
+        post = Post.objects.first()
+        before = self.version(post)
+        Client().login(username='author', password='password')
+        self.assertEqual(self.version(post), before)
+
+    def test_page_shows_edited_card(self):
+        """Лента показывает новую версию изменённой карточки"""
+        client = Client()
+        client.get(reverse('posts:main_page'))
+        post = Post.objects.first()
+        post.text = 'Исправленный текст'
+        post.save()
+        response = client.get(reverse('posts:main_page'))
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_pages_show_renamed_group_and_author(self):
+        """Ленты сразу показывают новое название группы и имя автора"""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        client = Client()
+        client.force_login(reader)
+        urls = [
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Новое'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertContains(response, 'Группа: Новое название')
+                self.assertContains(response, 'Автор: Новое')
+
+    def test_index_forgets_deleted_group(self):
+        """После удаления группы лента не показывает её в карточках"""
+        client = Client()
+        url = reverse('posts:main_page')
+        self.assertContains(client.get(url), 'Группа: Тестовая группа')
+        before = self.version(Post.objects.first())
+        Group.objects.get(pk=self.group.pk).delete()
+        response = client.get(url)
+        self.assertNotContains(response, 'Тестовая группа')
+        self.assertNotContains(response, '/group/the_group/')
+        self.assertGreater(self.version(Post.objects.first()), before)
@@ -1,10 +1,13 @@
+import base64
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import PostForm
 from ..models import Comment, Post, User
@@ -126,3 +129,127 @@ class PostsCreateFormTests(TestCase):
                 text=TEST_TEXT
             ).exists()
         )
+
+
+def make_jpeg(size, orientation=None):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    if orientation:
+        exif[0x0112] = orientation
+    output = BytesIO()
+    image.save(output, 'JPEG', exif=exif.tobytes())
+    return output.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIZE=100)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def create(self, name, content):
+        self.client.post(reverse('posts:post_create'), data={
+            'text': TEST_TEXT,
+            'image': SimpleUploadedFile(name, content),
+        })
+        return Post.objects.latest('pk')
+
+    def test_jpeg_is_rotated_downscaled_and_stripped(self):
+        """Большая фотография поворачивается по EXIF, уменьшается
+        и теряет метаданные; размеры записываются в пост"""
+        # Ориентация 6: снимок нужно повернуть на 90° по часовой.
+        post = self.create('rotated.jpg', make_jpeg((400, 200), 6))
+        self.assertEqual(post.image.name, 'posts/rotated.jpg')
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_format),
+            (50, 100, 'JPEG')
+        )
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertEqual(len(stored.getexif()), 0)
+
+    def test_other_formats_become_png(self):
+        output = BytesIO()
+        Image.new('RGB', (10, 20)).save(output, 'BMP')
+        post = self.create('picture.bmp', output.getvalue())
+        self.assertEqual(post.image.name, 'posts/picture.png')
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_format),
+            (10, 20, 'PNG')
+        )
+
+    def test_animation_is_resaved_frame_by_frame(self):
+        """Анимация уменьшается покадрово и теряет метаданные, а кадры
+        сохраняют свою длительность"""
+        frames = [Image.new('P', (400, 200), color) for color in (1, 2, 3)]
+        output = BytesIO()
+        frames[0].save(
+            output, 'GIF', save_all=True, append_images=frames[1:],
+            duration=[100, 200, 300], loop=0, comment=b'secret'
+        )
+        post = self.create('animation.gif', output.getvalue())
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_format),
+            (100, 50, 'GIF')
+        )
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.n_frames, 3)
+            self.assertNotIn('comment', stored.info)
+            durations = []
+            for index in range(stored.n_frames):
+                stored.seek(index)
+                self.assertEqual(stored.size, (100, 50))
+                durations.append(stored.info['duration'])
+        self.assertEqual(durations, [100, 200, 300])
+
+    def test_broken_image_is_form_error(self):
+        """Обрезанный JPEG отклоняется формой, а не роняет сервер"""
+        output = BytesIO()
+        Image.effect_noise((400, 200), 60).convert('RGB').save(
+            output, 'JPEG'
+        )
+        content = output.getvalue()
+        # Заголовок цел, поэтому проверку ImageField файл проходит.
+        response = self.client.post(reverse('posts:post_create'), data={
+            'text': TEST_TEXT,
+            'image': SimpleUploadedFile(
+                'broken.jpg', content[:len(content) // 2]
+            ),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_placeholder_is_tiny_blurred_copy(self):
+        """Заглушка — крошечная JPEG-копия картинки в data URI"""
+        post = self.create('landscape.jpg', make_jpeg((400, 200), 6))
+        prefix, encoded = post.image_placeholder.split(',')
+        self.assertEqual(prefix, 'data:image/jpeg;base64')
+        self.assertLess(len(post.image_placeholder), 1024)
+        with Image.open(BytesIO(base64.b64decode(encoded))) as placeholder:
+            self.assertEqual(
+                placeholder.size, (8, settings.IMAGE_PLACEHOLDER_SIZE)
+            )
+
+    def test_clearing_image_resets_metadata(self):
+        post = self.create('cleared.jpg', make_jpeg((20, 10)))
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': TEST_TEXT, 'image-clear': 'on'}
+        )
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_format, '')
+        self.assertEqual(post.image_placeholder, '')
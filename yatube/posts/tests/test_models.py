@@ -1,6 +1,14 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db.models.deletion import Collector
+from django.db.models.sql import DeleteQuery
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from .. import counters, deletion
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 AUTHOR = 'author'
 GROUP_SLUG = 'the_group'
@@ -32,3 +40,92 @@ class PostModelTest(TestCase):
         post_expected_name = post.text[:15]
         self.assertEqual(str(group), group_expected_name)
         self.assertEquals(str(post), post_expected_name)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username='follower')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками"""
+        post = Post.objects.create(author=self.user, text=TEST_TEXT)
+        Comment.objects.create(post=post, author=self.follower, text='1')
+        Comment.objects.create(post=post, author=self.follower, text='2')
+        Follow.objects.create(user=self.follower, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.post_count, 1)
+        self.assertEqual(stats.follower_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.follower).following_count, 1
+        )
+
+        Comment.objects.filter(text='1').delete()
+        Follow.objects.all().delete()
+        post.refresh_from_db()
+        stats.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(stats.follower_count, 0)
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.post_count, 0)
+
+    def test_failed_delete_keeps_comment_counter(self):
+        """Неудачное удаление поста не отключает счётчик его комментариев"""
+        post = Post.objects.create(author=self.user, text=TEST_TEXT)
+        Comment.objects.create(post=post, author=self.follower, text='1')
+        for delete in (post.delete, Post.objects.filter(pk=post.pk).delete):
+            with self.subTest(delete=delete):
+                with mock.patch.object(
+                    Collector, 'delete', side_effect=RuntimeError
+                ), self.assertRaises(RuntimeError):
+                    delete()
+                self.assertFalse(deletion.is_deleting(post.pk))
+        Comment.objects.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_deleted_user_skips_own_comment_counters(self):
+        """Удаление автора не обновляет счётчики его исчезающих постов"""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(author=author, text=TEST_TEXT)
+        other = Post.objects.create(author=self.follower, text=TEST_TEXT)
+        for text in '12':
+            Comment.objects.create(post=post, author=self.follower, text=text)
+        Comment.objects.create(post=other, author=author, text='3')
+        with mock.patch.object(
+            counters, 'bump_comment_count',
+            wraps=counters.bump_comment_count
+        ) as bump:
+            author.delete()
+        bump.assert_called_once_with(other.pk, -1)
+        self.assertFalse(deletion.is_deleting(post.pk))
+        other.refresh_from_db()
+        self.assertEqual(other.comment_count, 0)
+
+    def test_failed_user_delete_marks_reset(self):
+        """Отметки упавшего удаления автора снимаются с концом запроса"""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(author=author, text=TEST_TEXT)
+        with mock.patch.object(
+            DeleteQuery, 'delete_batch', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            author.delete()
+        request_finished.send(sender=None)
+        self.assertFalse(deletion.is_deleting(post.pk))
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile_counters исправляет расхождения"""
+        Post.objects.bulk_create([
+            Post(author=self.user, text=TEST_TEXT) for _ in range(3)
+        ])
+        UserStats.objects.filter(user=self.follower).delete()
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).post_count, 3
+        )
+        self.assertTrue(UserStats.objects.filter(user=self.follower).exists())
@@ -0,0 +1,108 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from ..search import FTS_TABLE
+
+AUTHOR = 'author'
+GROUP_SLUG = 'the_group'
+TEST_TEXT = 'Тестовый текст поста'
+# Полный просмотр таблицы без индекса или сортировка во временном B-дереве.
+BAD_PLAN = re.compile(r'^SCAN (?!.*\bUSING\b)(?!.*VIRTUAL TABLE)|TEMP B-TREE')
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=GROUP_SLUG,
+            description='Описание группы'
+        )
+        for i in range(15):
+            Post.objects.create(
+                text=f'{TEST_TEXT} {i}',
+                author=cls.author,
+                group=cls.group if i % 2 else None
+            )
+        cls.post = Post.objects.first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text=TEST_TEXT
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url, data=None, sorted_table=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.explain(sql):
+                if sorted_table and f'FROM {sorted_table} ' in sql and (
+                    step == 'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'
+                    or step == 'USE TEMP B-TREE FOR ORDER BY'
+                ):
+                    continue
+                with self.subTest(url=url, sql=sql):
+                    self.assertIsNone(BAD_PLAN.search(step), step)
+        return response
+
+    def test_feeds_use_indexes(self):
+        """Ленты читаются по индексам без сортировки во временной таблице"""
+        urls = [
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': GROUP_SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            response = self.assert_plans_use_indexes(url)
+            page_obj = response.context['page_obj']
+            if getattr(page_obj, 'next_cursor', None):
+                self.assert_plans_use_indexes(
+                    url, {'after': page_obj.next_cursor}
+                )
+
+    def test_post_detail_uses_indexes(self):
+        """Страница поста и комментарии читаются по индексам"""
+        self.assert_plans_use_indexes(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+
+    def test_api_uses_indexes(self):
+        """JSON-ленты и проверка их состояния идут по индексам"""
+        urls = [
+            reverse('api_v1:index'),
+            reverse('api_v1:group_list', kwargs={'slug': GROUP_SLUG}),
+            reverse('api_v1:profile', kwargs={'username': AUTHOR}),
+            reverse('api_v1:post_comments', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+
+    def test_search_uses_indexes(self):
+        """Поиск идёт через полнотекстовый индекс; сортируются только
+        найденные строки"""
+        self.assert_plans_use_indexes(
+            reverse('posts:main_page'), {'q': 'текст'},
+            sorted_table=FTS_TABLE
+        )
@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..rows import PostRow, post_rows
+
+AUTHOR = 'author'
+GROUP_SLUG = 'the_group'
+
+
+class PostRowsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username=AUTHOR, first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug=GROUP_SLUG, description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост в группе', author=cls.author, group=cls.group,
+            image='posts/picture.gif'
+        )
+        cls.lonely = Post.objects.create(
+            text='Пост без группы', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rows_replace_models(self):
+        """Строка содержит всё, что показывает карточка поста"""
+        with self.assertNumQueries(1):
+            row, lonely = post_rows(
+                Post.objects.filter(pk__in=[self.post.pk, self.lonely.pk])
+                .order_by('pk')
+            )
+        self.assertIsInstance(row, PostRow)
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual(row, self.post)
+        self.assertEqual(row.author, self.author)
+        self.assertEqual(row.group, self.group)
+        self.assertEqual(row.author.get_full_name(), 'Лев Толстой')
+        self.assertEqual(row.group.slug, GROUP_SLUG)
+        self.assertEqual(row.image, self.post.image)
+        self.assertEqual(row.image.url, self.post.image.url)
+        self.assertIsNone(lonely.group)
+        self.assertFalse(lonely.image)
+
+    def test_filters_and_slices_keep_rows(self):
+        """Копии выборки после filter, order_by и срезов тоже дают строки"""
+        rows = post_rows(Post.objects.all())
+        self.assertEqual(rows.count(), 2)
+        first, = rows.order_by('pk')[:1]
+        self.assertIsInstance(first, PostRow)
+        self.assertEqual(first, self.post)
+        self.assertEqual(rows.filter(group=None)[0], self.lonely)
+        self.assertEqual(
+            rows.in_bulk([self.lonely.pk]), {self.lonely.pk: self.lonely}
+        )
+
+    def test_feed_pages_render_rows(self):
+        """Ленты отдают шаблонам строки, а не модели"""
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': GROUP_SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+        )
+        client = Client()
+        for url in urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                page_obj = response.context['page_obj']
+                self.assertIsInstance(page_obj[0], PostRow)
+                self.assertContains(response, 'Тестовая группа')
+                self.assertContains(
+                    response, reverse('posts:post_detail', args=[self.post.pk])
+                )
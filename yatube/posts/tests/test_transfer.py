@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import transfer
+from ..models import (Comment, FeedEntry, Follow, Group, Post, User,
+                      UserStats)
+from ..search import search_posts
+
+TEST_TEXT = 'Тестовый текст поста'
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.old_date = timezone.now() - timedelta(days=30)
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'{TEST_TEXT} {i}', author=self.author, group=group
+            )
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий'
+            )
+        Post.objects.update(pub_date=self.old_date)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self):
+        stream = StringIO()
+        transfer.export(stream, chunk_size=2)
+        return stream.getvalue()
+
+    def clear(self):
+        for model in (Follow, Comment, Post, Group):
+            model.objects.all().delete()
+
+    def test_round_trip(self):
+        """Выгруженные данные загружаются обратно с датами и id"""
+        data = self.export()
+        ids = list(Post.objects.values_list('pk', flat=True))
+        self.clear()
+        counts = transfer.Importer(batch_size=2).run(StringIO(data))
+        self.assertEqual(counts['post'], {'loaded': 5, 'skipped': 0})
+        self.assertEqual(
+            list(Post.objects.values_list('pk', flat=True)), ids
+        )
+        self.assertFalse(Post.objects.exclude(pub_date=self.old_date))
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+        self.assertEqual(search_posts(Post.objects.all(), 'текст').count(), 5)
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка того же файла ничего не дублирует"""
+        data = self.export()
+        transfer.Importer().run(StringIO(data))
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_existing_rows_are_skipped(self):
+        """Строки с занятыми id пропускаются и не меняют поисковый индекс"""
+        post = Post.objects.first()
+        post.text = 'кошка гуляет'
+        post.save()
+        data = self.export().replace('кошка гуляет', 'собака лает')
+        counts = transfer.Importer().run(StringIO(data))
+        self.assertEqual(counts['post'], {'loaded': 0, 'skipped': 5})
+        self.assertEqual(counts['comment'], {'loaded': 0, 'skipped': 5})
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'кошка гуляет')
+        self.assertEqual(
+            list(search_posts(Post.objects.all(), 'кошка')[:10]), [post]
+        )
+        self.assertEqual(search_posts(Post.objects.all(), 'собака').count(), 0)
+
+    def test_remap_and_create_users(self):
+        """Авторов можно переименовать, недостающих — создать"""
+        data = self.export()
+        self.clear()
+        User.objects.filter(username='reader').delete()
+        counts = transfer.Importer(
+            remap={'author': 'new_author'}
+        ).run(StringIO(data))
+        self.assertEqual(counts['post']['skipped'], 5)
+        transfer.Importer(
+            remap={'author': 'new_author'}, create_users=True
+        ).run(StringIO(data))
+        new_author = User.objects.get(username='new_author')
+        self.assertEqual(new_author.posts.count(), 5)
+        self.assertFalse(new_author.has_usable_password())
+        self.assertTrue(User.objects.filter(username='reader').exists())
+
+    def test_resume_from_checkpoint(self):
+        """После сбоя загрузка продолжается с контрольной точки"""
+        lines = self.export().splitlines(keepends=True)
+        self.clear()
+        broken = lines[:7] + ['{"model": "unknown"}\n'] + lines[7:]
+        checkpoint = os.path.join(self.directory, 'checkpoint')
+        with self.assertRaises(ValueError):
+            transfer.Importer(
+                batch_size=2, checkpoint=checkpoint
+            ).run(StringIO(''.join(broken)))
+        with open(checkpoint) as file:
+            done = int(file.read())
+        self.assertEqual(done, 7)
+        broken[7] = '\n'
+        transfer.Importer(
+            batch_size=2, checkpoint=checkpoint
+        ).run(StringIO(''.join(broken)))
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_commands_rebuild_derived_data(self):
+        """Команды выгрузки и загрузки пересчитывают счётчики и ленты"""
+        path = os.path.join(self.directory, 'dump.ndjson.gz')
+        call_command('export_ndjson', path, stderr=StringIO())
+        self.clear()
+        call_command('import_ndjson', path, stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.author).post_count, 5)
+        self.assertEqual(Post.objects.filter(comment_count=1).count(), 5)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 5)
+
+    def test_export_format(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual(
+            [row['model'] for row in rows],
+            ['group'] + ['post'] * 5 + ['comment'] * 5 + ['follow']
+        )
+        self.assertEqual(rows[1]['author'], 'author')
+        self.assertEqual(rows[1]['group'], 'group')
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
@@ -8,8 +9,12 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.shortcuts import get_object_or_404
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
 
-from ..models import Comment, Follow, Group, Post, User
+from core.testing import lagging_replica
+
+from .. import feed_cache, thumbnails
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
 
 FIRST_PAGE_COUNT = 10
 SECOND_PAGE_COUNT = 1
@@ -273,6 +278,7 @@ class PostsCacheTests(TestCase):
         self.user = User.objects.get(username=AUTHOR)
         self.authorized_author = Client()
         self.authorized_author.force_login(self.user)
+        cache.clear()
 
     def test_index_cache(self):
         """Cache главной страницы работает"""
@@ -283,12 +289,12 @@ class PostsCacheTests(TestCase):
             self.authorized_author.get(reverse('posts:main_page'))
         )
         default_content = response.content
-        cached_post.delete()
+        # обновление в обход сигналов не сбрасывает кэш
+        Post.objects.filter(pk=cached_post.pk).update(text='changed')
         response2 = (
             self.authorized_author.get(reverse('posts:main_page'))
         )
-        changed_content = response2.content
-        self.assertEqual(default_content, changed_content)
+        self.assertEqual(default_content, response2.content)
         cache.clear()
         response3 = (
             self.authorized_author.get(reverse('posts:main_page'))
@@ -296,6 +302,76 @@ class PostsCacheTests(TestCase):
         cleared_cache_content = response3.content
         self.assertNotEqual(default_content, cleared_cache_content)
 
+    def test_writes_invalidate_feed_cache(self):
+        """Запись в ленту сразу меняет закэшированные страницы"""
+        post = Post.objects.create(text='first', author=self.author)
+        urls = [
+            reverse('posts:main_page'),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+        ]
+        for url in urls:
+            self.assertContains(self.authorized_author.get(url), 'first')
+        post.text = 'second'
+        post.save()
+        for url in urls:
+            self.assertContains(self.authorized_author.get(url), 'second')
+        post.delete()
+        for url in urls:
+            self.assertNotContains(
+                self.authorized_author.get(url), 'second'
+            )
+
+    def test_cache_varies_by_page(self):
+        """Разные страницы ленты кэшируются отдельно"""
+        Post.objects.bulk_create([
+            Post(text=f'post {i}', author=self.author) for i in range(15)
+        ])
+        url = reverse('posts:main_page')
+        first = self.authorized_author.get(url, {'page': 1}).content
+        second = self.authorized_author.get(url, {'page': 2}).content
+        self.assertNotEqual(first, second)
+
+    def test_feeds_bumped_again_after_commit(self):
+        """После фиксации записи поколения лент сбрасываются ещё раз:
+        фрагменты, построенные до фиксации, больше не отдаются"""
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(text='first', author=self.author)
+        keys = [
+            *feed_cache.post_keys(post), feed_cache.follow_key(reader.pk)
+        ]
+        writes = {
+            'комментарий': lambda: Comment.objects.create(
+                post=post, author=reader, text='Комментарий'
+            ),
+            'подписка': lambda: Follow.objects.create(
+                user=reader, author=self.author
+            ),
+            'удаление': lambda: Post.objects.get(pk=post.pk).delete(),
+        }
+        for write, make in writes.items():
+            with self.subTest(write=write):
+                with mock.patch.object(
+                    feed_cache.transaction, 'on_commit'
+                ) as on_commit:
+                    make()
+                before_commit = feed_cache.get_version(*keys)
+                for call in on_commit.call_args_list:
+                    call[0][0]()
+                self.assertNotEqual(
+                    feed_cache.get_version(*keys), before_commit
+                )
+
+    def test_lagging_replica_does_not_poison_feed_cache(self):
+        """Новый фрагмент ленты строится по основной базе, даже если
+        реплика ещё не получила последние записи"""
+        url = reverse('posts:main_page')
+        self.authorized_author.get(url)
+        with lagging_replica():
+            Post.objects.create(text='свежий пост', author=self.author)
+            self.assertContains(Client().get(url), 'свежий пост')
+            # Готовый фрагмент отдаётся из кэша без основной базы.
+            self.assertContains(Client().get(url), 'свежий пост')
+
 
 class FollowingTest(TestCase):
     @classmethod
@@ -405,3 +481,524 @@ class FollowingTest(TestCase):
         )
         posts = response.context['posts']
         self.assertNotIn(new_post, posts)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        Post.objects.bulk_create([
+            Post(
+                text=f'{TEST_TEXT} {i}',
+                author=cls.author
+            ) for i in range(25)
+        ])
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_walks_whole_feed(self):
+        """Курсоры after/before обходят ленту без пропусков и повторов"""
+        url = reverse('posts:main_page')
+        seen = []
+        response = self.guest_client.get(url)
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_keyset)
+        self.assertFalse(page_obj.has_previous())
+        seen.extend(page_obj)
+        while page_obj.has_next():
+            response = self.guest_client.get(
+                url, {'after': page_obj.next_cursor}
+            )
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+        self.assertEqual(
+            [post.pk for post in seen],
+            list(Post.objects.order_by('-pub_date', '-pk')
+                 .values_list('pk', flat=True))
+        )
+        self.assertEqual(len(page_obj), 5)
+        response = self.guest_client.get(
+            url, {'before': page_obj.previous_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), seen[10:20]
+        )
+
+    def test_page_number_fallback(self):
+        """Ссылки ?page=N продолжают работать"""
+        response = self.guest_client.get(
+            reverse('posts:main_page'), {'page': 3}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(len(page_obj), 5)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:main_page'), {'after': 'garbage'}
+        )
+        self.assertEqual(len(response.context['page_obj']), FIRST_PAGE_COUNT)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.post_about_cats = Post.objects.create(
+            text='Сегодня кошки гуляли во дворе',
+            author=cls.author
+        )
+        cls.post_about_dogs = Post.objects.create(
+            text='Собака лаяла на прохожих',
+            author=cls.author
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def search(self, query):
+        response = self.guest_client.get(
+            reverse('posts:main_page'), {'q': query}
+        )
+        return list(response.context['page_obj'])
+
+    def test_search_uses_stems(self):
+        """Поиск находит другие словоформы русских слов"""
+        self.assertEqual(self.search('кошка'), [self.post_about_cats])
+        self.assertEqual(self.search('СОБАКИ'), [self.post_about_dogs])
+        self.assertEqual(self.search('кошка собака'), [])
+
+    def test_search_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.get(pk=self.post_about_dogs.pk)
+        post.text = 'Кошки тоже бывают на прохожих'
+        post.save()
+        self.assertEqual(len(self.search('кошкам')), 2)
+        post.delete()
+        self.assertEqual(self.search('кошкам'), [self.post_about_cats])
+
+    def test_equal_rank_pages_do_not_overlap(self):
+        """Посты с равным рангом делятся на страницы без повторов"""
+        posts = [
+            Post.objects.create(text='Одинаковый текст', author=self.author)
+            for _ in range(15)
+        ]
+        found = []
+        for page in (1, 2):
+            response = self.guest_client.get(
+                reverse('posts:main_page'), {'q': 'одинаковый', 'page': page}
+            )
+            found += [post.pk for post in response.context['page_obj']]
+        self.assertEqual(
+            found, sorted((post.pk for post in posts), reverse=True)
+        )
+
+    def test_search_snippet(self):
+        """Найденные слова выделены в сниппете"""
+        post, = self.search('гулять')
+        self.assertIn('<mark>гуляли</mark>', post.snippet)
+
+
+class FeedEntryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username='follower')
+        cls.old_post = Post.objects.create(text=TEST_TEXT, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower)
+
+    def get_feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_post_fans_out(self):
+        """Подписка заполняет ленту, новый пост раскладывается подписчикам"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.follower).count(), 2
+        )
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    def test_unfollow_and_delete_trim_feed(self):
+        """Отписка и удаление поста чистят ленту"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(text=TEST_TEXT, author=self.author).delete()
+        self.assertEqual(self.get_feed(), [self.old_post])
+        Follow.objects.filter(user=self.follower).delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты популярных авторов подмешиваются при чтении"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_feed_kept_when_author_drops_below_threshold(self):
+        """Посты, опубликованные, пока автор был популярным, остаются
+        в ленте, когда подписчиков снова становится мало"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        Follow.objects.filter(user=self.follower).delete()
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.follower).count(), 2
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+        cache.clear()
+
+    def get_uploaded(self):
+        return SimpleUploadedFile(
+            name='small.gif', content=IMAGE, content_type='image/gif'
+        )
+
+    def ready(self, post, variant):
+        return thumbnails.lookup_many([post.image], variant)[post.image.name]
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, шаблон показывает заглушку и не строит её"""
+        post = Post.objects.create(
+            text=TEST_TEXT, author=self.author, image=self.get_uploaded()
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        response = self.authorized_author.get(url)
+        self.assertContains(response, 'Изображение обрабатывается')
+        self.assertIsNone(self.ready(post, 'card'))
+        thumbnails.generate(post)
+        thumbnail = self.ready(post, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_author.get(url)
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'Изображение обрабатывается')
+
+    def test_create_builds_all_variants(self):
+        """После загрузки картинки строятся все размеры из настроек"""
+        self.authorized_author.post(
+            reverse('posts:post_create'),
+            data={'text': TEST_TEXT, 'image': self.get_uploaded()}
+        )
+        post = Post.objects.get()
+        for variant in settings.POST_THUMBNAILS:
+            with self.subTest(variant=variant):
+                self.assertIsNotNone(self.ready(post, variant))
+
+    def test_ready_thumbnail_invalidates_feed(self):
+        """Готовые миниатюры сбрасывают закэшированную ленту"""
+        post = Post.objects.create(
+            text=TEST_TEXT, author=self.author, image=self.get_uploaded()
+        )
+        url = reverse('posts:profile', kwargs={'username': AUTHOR})
+        self.assertContains(
+            self.authorized_author.get(url), 'Изображение обрабатывается'
+        )
+        thumbnails.generate(post)
+        self.assertContains(
+            self.authorized_author.get(url),
+            self.ready(post, 'profile').url
+        )
+
+    @override_settings(
+        POST_THUMBNAIL_WIDTHS={'card': (20, 40)},
+        POST_THUMBNAIL_FORMATS=('PNG',)
+    )
+    def test_responsive_variants(self):
+        """Карточка получает srcset всех ширин и современных форматов"""
+        post = Post.objects.create(
+            text=TEST_TEXT, author=self.author, image=self.get_uploaded()
+        )
+        self.assertEqual(
+            thumbnails.renditions('card')[0][2:],
+            settings.POST_THUMBNAILS['card']
+        )
+        thumbnails.generate(post)
+        self.assertEqual(thumbnails.missing(post.image), [])
+        picture = thumbnails.lookup_many([post.image], 'card')[post.image.name]
+        self.assertEqual(
+            [thumbnail.width for thumbnail in picture.candidates[None]],
+            [960, 40, 20]
+        )
+        response = self.authorized_author.get(reverse('posts:main_page'))
+        self.assertContains(response, f'src="{picture.url}"')
+        self.assertContains(response, f'srcset="{picture.srcset()}"')
+        self.assertContains(response, 'width="20" height="7"')
+        self.assertContains(response, 'sizes="20px"', count=2)
+        self.assertContains(
+            response, f'<source type="image/png" srcset="'
+            f'{picture.srcset("PNG")}"'
+        )
+
+    def test_lazy_images_with_placeholder(self):
+        """Картинки лент грузятся лениво поверх размытой заглушки"""
+        self.authorized_author.post(
+            reverse('posts:post_create'),
+            data={'text': TEST_TEXT, 'image': self.get_uploaded()}
+        )
+        post = Post.objects.get()
+        self.assertTrue(post.image_placeholder)
+        background = f'url({post.image_placeholder})'
+        for url, loading in (
+            (reverse('posts:main_page'), 'lazy'),
+            (reverse('posts:profile', kwargs={'username': AUTHOR}), 'lazy'),
+            (reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+             'eager'),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_author.get(url)
+                self.assertContains(response, f'loading="{loading}"')
+                self.assertContains(response, background)
+
+    def test_widths_follow_display_sizes(self):
+        """Ширины миниатюр — те, в которых их показывают шаблоны,
+        и удвоенные"""
+        for variant, widths in (('card', [960, 40, 20]),
+                                ('profile', [960, 460, 230])):
+            with self.subTest(variant=variant):
+                self.assertEqual(
+                    [rendition.width for rendition
+                     in thumbnails.renditions(variant)
+                     if rendition.format is None],
+                    widths
+                )
+
+    @override_settings(POST_THUMBNAIL_FORMATS=('NOSUCHFORMAT',))
+    def test_unsupported_format_skipped(self):
+        """Форматы, которые не умеет сохранять Pillow, пропускаются"""
+        self.assertEqual(
+            {rendition.format for rendition in thumbnails.renditions('card')},
+            {None}
+        )
+
+    def test_page_thumbnails_resolved_in_one_batch(self):
+        """Миниатюры страницы ищутся одним запросом, а не по одной"""
+        posts = [
+            Post.objects.create(
+                text=TEST_TEXT, author=self.author,
+                image=SimpleUploadedFile(
+                    name=f'small{i}.gif', content=IMAGE,
+                    content_type='image/gif'
+                )
+            )
+            for i in range(5)
+        ]
+        for post in posts[1:]:
+            thumbnails.generate(post)
+        cache.clear()
+        images = [post.image for post in posts]
+        with self.assertNumQueries(1):
+            ready = thumbnails.lookup_many(images, 'card')
+        with self.assertNumQueries(0):
+            warm = thumbnails.lookup_many(images, 'card')
+        self.assertEqual(warm.keys(), ready.keys())
+        self.assertIsNone(ready[posts[0].image.name])
+        geometry, options = settings.POST_THUMBNAILS['card']
+        for post in posts[1:]:
+            self.assertEqual(
+                ready[post.image.name].url,
+                get_thumbnail(post.image, geometry, **options).url
+            )
+        cache.clear()
+        with mock.patch.object(
+            thumbnails.default.kvstore, 'get'
+        ) as kvstore_get:
+            response = self.authorized_author.get(reverse('posts:main_page'))
+        kvstore_get.assert_not_called()
+        for post in posts[1:]:
+            self.assertContains(response, ready[post.image.name].url)
+        self.assertContains(response, 'Изображение обрабатывается', count=1)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title=GROUP_TITLE,
+            slug=GROUP_SLUG,
+            description=GROUP_DESCRIPTION
+        )
+        cls.post = Post.objects.create(
+            text=TEST_TEXT, author=cls.author, group=cls.group
+        )
+        cls.urls = [
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': GROUP_SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+        # Страница с формой выдаёт CSRF-cookie, как браузеру при первом
+        # визите.
+        self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertIn(settings.CSRF_COOKIE_NAME, self.client.cookies)
+
+    def etags(self):
+        return {url: self.client.get(url)['ETag'] for url in self.urls}
+
+    def test_not_modified_skips_rendering(self):
+        """Совпавший ETag даёт 304 без рендеринга шаблона"""
+        for url, etag in self.etags().items():
+            with self.subTest(url=url):
+                with mock.patch('posts.views.render') as render:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                render.assert_not_called()
+
+    def test_etag_depends_on_viewer(self):
+        """Другой пользователь получает свою страницу"""
+        etags = self.etags()
+        self.client.force_login(self.author)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('Last-Modified', response)
+
+    def test_new_csrf_token_changes_etag(self):
+        """После повторного входа страница с формами отдаётся заново"""
+        etags = self.etags()
+        self.client.logout()
+        self.client.force_login(self.reader)
+        # Браузер получает новый токен в ответе на вход.
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'new-token'
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_writes_change_etag(self):
+        """Новый комментарий и правка поста меняют ETag страниц"""
+        etags = self.etags()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text=TEST_TEXT
+        )
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_renamed_commenter_changes_post_etag(self):
+        """Новое имя комментатора видно на странице поста и в API"""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text=TEST_TEXT
+        )
+        urls = [
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('api_v1:post_comments', kwargs={'post_id': self.post.pk}),
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        self.reader.username = 'renamed_reader'
+        self.reader.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'renamed_reader')
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет кнопку на странице автора"""
+        url = reverse('posts:profile', kwargs={'username': AUTHOR})
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_post_is_404(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENTS_INLINE=3, COMMENTS_PAGE_SIZE=2)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.post = Post.objects.create(text=TEST_TEXT, author=cls.author)
+        for i in range(6):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_inline_cap_and_load_more(self):
+        """Страница поста показывает первые комментарии, остальные
+        подгружаются фрагментами по курсору"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            self.texts(comments), [f'Комментарий {i}' for i in range(3)]
+        )
+        self.assertContains(response, 'data-comments-more')
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        loaded = []
+        cursor = comments.next_cursor
+        while cursor:
+            response = self.client.get(url, {'after': cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            self.assertNotContains(response, '<html')
+            page = response.context['comments']
+            loaded.extend(self.texts(page))
+            cursor = page.next_cursor
+        self.assertEqual(loaded, [f'Комментарий {i}' for i in range(3, 6)])
+        self.assertNotContains(response, 'data-comments-more')
+
+    def test_fragment_queries_do_not_grow(self):
+        """Авторы комментариев подтягиваются одним запросом"""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        with self.assertNumQueries(2):
+            self.client.get(url)
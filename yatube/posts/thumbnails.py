@@ -0,0 +1,279 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Все размеры, которые показывают шаблоны, перечислены в
+``settings.POST_THUMBNAILS``. Каждый вариант строится ещё и в тех
+ширинах, в которых его показывают шаблоны (``POST_THUMBNAIL_WIDTHS``,
+обычная и удвоенная плотность), и в форматах из
+``POST_THUMBNAIL_FORMATS`` (WebP), чтобы браузер выбирал по ``srcset``
+файл под свой экран и не скачивал большую миниатюру ради маленькой
+картинки. После загрузки картинки все размеры строятся в фоновом пуле
+потоков, а шаблоны только ищут готовые миниатюры в хранилище ключей
+sorl-thumbnail и, если их ещё нет, показывают заглушку. Ленты ищут
+миниатюры всей страницы сразу (``lookup_many``): один ``get_many``
+к кэшу и один запрос к таблице для промахов. Когда миниатюры поста
+готовы, сбрасываются поколения его лент, чтобы
+закэшированные фрагменты с заглушкой перестали отдаваться.
+"""
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+Rendition = namedtuple('Rendition', 'width format geometry options')
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def _options(source, options):
+    # Те же умолчания, что подставляет ThumbnailBackend.get_thumbnail:
+    # иначе имя файла миниатюры и ключ в хранилище не совпадут.
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _formats():
+    """Современные форматы из настроек, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_THUMBNAIL_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def renditions(variant):
+    """Все размеры варианта: основной из ``POST_THUMBNAILS`` и его
+    уменьшенные до ширин варианта в ``POST_THUMBNAIL_WIDTHS`` копии,
+    каждый в формате по умолчанию (``format=None``) и в современных
+    форматах.
+
+    Основной размер в формате по умолчанию идёт первым.
+    """
+    geometry, options = settings.POST_THUMBNAILS[variant]
+    width, height = (int(side) for side in geometry.split('x'))
+    widths = [width] + sorted(
+        {size for size in settings.POST_THUMBNAIL_WIDTHS.get(variant, ())
+         if size < width},
+        reverse=True
+    )
+    return [
+        Rendition(
+            size, image_format, f'{size}x{round(height * size / width)}',
+            dict(options, format=image_format) if image_format else options
+        )
+        for image_format in [None, *_formats()]
+        for size in widths
+    ]
+
+
+def _thumbnail(image, geometry, options):
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _options(source, options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def _key(image, rendition):
+    return add_prefix(
+        _thumbnail(image, rendition.geometry, rendition.options).key
+    )
+
+
+def _get_many_raw(keys):
+    """``KVStore._get_raw`` хранилища cached_db сразу для всех ключей."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    misses = [key for key in keys if key not in values]
+    if misses:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=misses)
+            .values_list('key', 'value')
+        )
+        # Отсутствие тоже кэшируется, как это делает sorl-thumbnail.
+        stored = {key: found.get(key, EMPTY_VALUE) for key in misses}
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    return {
+        key: value for key, value in values.items()
+        if value and value != EMPTY_VALUE
+    }
+
+
+class Picture:
+    """Готовые размеры одной картинки для ``<picture>``.
+
+    ``candidates`` — формат (``None`` — по умолчанию) -> миниатюры
+    по убыванию ширины; первая в формате по умолчанию — основная.
+    """
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+
+    @property
+    def fallback(self):
+        return self.candidates[None][0]
+
+    @property
+    def url(self):
+        return self.fallback.url
+
+    @property
+    def width(self):
+        return self.fallback.width
+
+    @property
+    def height(self):
+        return self.fallback.height
+
+    def sources(self):
+        """Пары (MIME-тип, srcset) современных форматов."""
+        return [
+            (Image.MIME[image_format], self.srcset(image_format))
+            for image_format in self.candidates if image_format
+        ]
+
+    def srcset(self, image_format=None):
+        seen = set()
+        candidates = []
+        # Без увеличения маленький оригинал даёт одинаковые миниатюры.
+        for thumbnail in reversed(self.candidates[image_format]):
+            if thumbnail.width not in seen:
+                seen.add(thumbnail.width)
+                candidates.append(f'{thumbnail.url} {thumbnail.width}w')
+        return ', '.join(candidates)
+
+
+def lookup_many(images, variant):
+    """Готовые миниатюры нескольких картинок: словарь имя -> ``Picture``
+    или ``None``, пока нет основной миниатюры. Пустые картинки
+    пропускаются."""
+    variant_renditions = renditions(variant)
+    keys = {
+        image.name: [_key(image, rendition) for rendition in
+                     variant_renditions]
+        for image in images if image
+    }
+    values = _get_many_raw(list({
+        key for image_keys in keys.values() for key in image_keys
+    }))
+    pictures = {}
+    for name, image_keys in keys.items():
+        if image_keys[0] not in values:
+            pictures[name] = None
+            continue
+        candidates = {}
+        for rendition, key in zip(variant_renditions, image_keys):
+            if key in values:
+                candidates.setdefault(rendition.format, []).append(
+                    deserialize_image_file(values[key])
+                )
+        pictures[name] = Picture(candidates)
+    return pictures
+
+
+def missing(image):
+    """Варианты из ``POST_THUMBNAILS``, у которых ещё не все размеры
+    есть в хранилище ключей."""
+    variants = {
+        variant: [_key(image, rendition) for rendition in renditions(variant)]
+        for variant in settings.POST_THUMBNAILS
+    }
+    values = _get_many_raw(list({
+        key for keys in variants.values() for key in keys
+    }))
+    return [
+        variant for variant, keys in variants.items()
+        if any(key not in values for key in keys)
+    ]
+
+
+def build(image, variants=None):
+    """Строит все размеры миниатюр картинки, по умолчанию всех
+    вариантов; готовые sorl-thumbnail не пересоздаёт."""
+    for variant in variants or settings.POST_THUMBNAILS:
+        for rendition in renditions(variant):
+            get_thumbnail(image, rendition.geometry, **rendition.options)
+
+
+def generate(post):
+    """Строит все миниатюры картинки поста и обновляет его ленты."""
+    build(post.image)
+    Post.objects.filter(pk=post.pk).update(version=F('version') + 1)
+    feed_cache.bump(*feed_cache.post_keys(post))
+
+
+def _run(post):
+    try:
+        generate(post)
+    except Exception:
+        logger.exception('Failed to build thumbnails for %s', post.image.name)
+    finally:
+        with _pending_lock:
+            _pending.discard(post.image.name)
+        connection.close()
+
+
+def _submit(post):
+    with _pending_lock:
+        if post.image.name in _pending:
+            return
+        _pending.add(post.image.name)
+    _get_executor().submit(_run, post)
+
+
+def schedule(post):
+    """Ставит построение миниатюр в фоновый пул после фиксации транзакции.
+
+    Повторная постановка той же картинки, пока она в работе,
+    игнорируется. При ``THUMBNAIL_WORKERS = 0`` миниатюры строятся сразу.
+    """
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post)
+        return
+    transaction.on_commit(partial(_submit, post))
@@ -0,0 +1,296 @@
+"""Выгрузка и загрузка групп, постов, комментариев и подписок в NDJSON.
+
+Каждая строка файла — один объект с полем ``model``. Группы, посты,
+комментарии и подписки идут в этом порядке, чтобы при загрузке ссылки
+уже указывали на существующие строки. Пользователи и группы задаются
+именами и слагами, посты и комментарии сохраняют свои id, поэтому
+повторная загрузка того же файла ничего не дублирует.
+
+Выгрузка читает базу ``iterator(chunk_size=...)``, загрузка пишет
+``bulk_create`` пачками, каждая пачка в своей транзакции, и после неё
+запоминает номер строки в файле контрольной точки. Память не растёт
+с размером файла.
+"""
+import gzip
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from . import search
+from .models import Comment, Follow, Group, Post, User
+
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+
+
+def bulk_create_dated(model, objects, **kwargs):
+    """``bulk_create``, который сохраняет заданные даты в полях
+    с ``auto_now_add``.
+
+    ``bulk_create`` ставит в такие поля текущее время, поэтому даты
+    записываются вторым запросом ``bulk_update``; pk объектов должны
+    быть заданы заранее.
+    """
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    dates = [
+        [getattr(instance, field) for field in fields] for instance in objects
+    ]
+    model.objects.bulk_create(objects, **kwargs)
+    if fields and objects:
+        for instance, values in zip(objects, dates):
+            for field, value in zip(fields, values):
+                setattr(instance, field, value)
+        model.objects.bulk_update(objects, fields)
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Открывает файл, ``.gz`` через gzip, ``-`` — стандартный ввод/вывод."""
+    if path == '-':
+        yield sys.stdout if 'w' in mode else sys.stdin
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, mode + 't', encoding='utf-8') as stream:
+        yield stream
+
+
+def _encode(value):
+    # DjangoJSONEncoder обрезает микросекунды, а даты должны
+    # возвращаться при загрузке без изменений.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _rename(rows, **names):
+    for row in rows:
+        yield {names.get(key, key): value for key, value in row.items()}
+
+
+def export_rows(model, chunk_size):
+    if model == 'group':
+        rows = Group.objects.order_by('pk').values(
+            'slug', 'title', 'description'
+        )
+    elif model == 'post':
+        rows = Post.objects.order_by('pk').values(
+            'id', 'text', 'pub_date', 'image', 'image_width',
+            'image_height', 'image_format', 'image_placeholder',
+            'author__username', 'group__slug'
+        )
+    elif model == 'comment':
+        rows = Comment.objects.order_by('pk').values(
+            'id', 'post_id', 'author__username', 'text', 'created'
+        )
+    else:
+        rows = Follow.objects.order_by('pk').values(
+            'user__username', 'author__username'
+        )
+    return _rename(
+        rows.iterator(chunk_size=chunk_size),
+        author__username='author',
+        user__username='user',
+        group__slug='group',
+        post_id='post',
+    )
+
+
+def export(stream, models=MODELS, chunk_size=2000):
+    """Пишет выбранные модели в поток; возвращает число строк каждой."""
+    counts = {}
+    for model in MODELS:
+        if model not in models:
+            continue
+        counts[model] = 0
+        for row in export_rows(model, chunk_size):
+            row['model'] = model
+            stream.write(
+                json.dumps(row, ensure_ascii=False, default=_encode)
+            )
+            stream.write('\n')
+            counts[model] += 1
+    return counts
+
+
+class Importer:
+    """Загружает строки NDJSON пачками по ``batch_size``.
+
+    ``remap`` переименовывает авторов: ``{'старое имя': 'новое'}``.
+    Строки с неизвестными пользователями пропускаются, если не задан
+    ``create_users``. ``id_offset`` сдвигает id постов и комментариев,
+    когда данные вливаются в базу, где эти id уже заняты.
+    """
+
+    def __init__(self, batch_size=1000, remap=None, create_users=False,
+                 id_offset=0, checkpoint=None):
+        self.batch_size = batch_size
+        self.remap = remap or {}
+        self.create_users = create_users
+        self.id_offset = id_offset
+        self.checkpoint = checkpoint
+        self.counts = {model: {'loaded': 0, 'skipped': 0} for model in MODELS}
+
+    def read_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as file:
+            return int(file.read().strip() or 0)
+
+    def write_checkpoint(self, line):
+        if not self.checkpoint:
+            return
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(str(line))
+        os.replace(temporary, self.checkpoint)
+
+    def run(self, stream):
+        start = self.read_checkpoint()
+        batch, model, line = [], None, start
+        for line, text in enumerate(stream, 1):
+            if line <= start or not text.strip():
+                continue
+            row = json.loads(text)
+            if row['model'] != model or len(batch) == self.batch_size:
+                self.flush(model, batch, line - 1)
+                batch, model = [], row['model']
+            batch.append(row)
+        self.flush(model, batch, line)
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        return self.counts
+
+    def flush(self, model, rows, line):
+        if rows:
+            if model not in MODELS:
+                raise ValueError(f'Неизвестная модель {model!r}')
+            with transaction.atomic():
+                objects = self.new_objects(
+                    model, getattr(self, f'build_{model}')(rows)
+                )
+                bulk_create_dated(
+                    MODELS[model], objects, ignore_conflicts=True
+                )
+                if model == 'post':
+                    search.index_posts(objects)
+            self.counts[model]['loaded'] += len(objects)
+            self.counts[model]['skipped'] += len(rows) - len(objects)
+        self.write_checkpoint(line)
+
+    def new_objects(self, model, objects):
+        """Отбрасывает объекты, которые уже есть в базе: их строки
+        пропускаются, а не перезаписываются."""
+        if model == 'group':
+            taken = set(Group.objects.filter(
+                slug__in=[group.slug for group in objects]
+            ).values_list('slug', flat=True))
+            return [group for group in objects if group.slug not in taken]
+        if model == 'follow':
+            taken = set(Follow.objects.filter(
+                user__in={follow.user_id for follow in objects},
+                author__in={follow.author_id for follow in objects},
+            ).values_list('user', 'author'))
+            return [
+                follow for follow in objects
+                if (follow.user_id, follow.author_id) not in taken
+            ]
+        taken = set(MODELS[model].objects.filter(
+            pk__in=[instance.pk for instance in objects]
+        ).values_list('pk', flat=True))
+        return [instance for instance in objects if instance.pk not in taken]
+
+    def user_ids(self, rows, *fields):
+        names = {
+            self.remap.get(row[field], row[field])
+            for row in rows for field in fields
+        }
+        found = dict(
+            User.objects.filter(username__in=names)
+            .values_list('username', 'pk')
+        )
+        missing = names - set(found)
+        if missing and self.create_users:
+            User.objects.bulk_create([
+                User(username=name, password=make_password(None))
+                for name in missing
+            ], ignore_conflicts=True)
+            found.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'pk')
+            )
+        return {
+            name: found[self.remap.get(name, name)]
+            for row in rows for field in fields
+            for name in [row[field]]
+            if self.remap.get(name, name) in found
+        }
+
+    def build_group(self, rows):
+        return [
+            Group(
+                slug=row['slug'],
+                title=row['title'],
+                description=row['description']
+            ) for row in rows
+        ]
+
+    def build_post(self, rows):
+        users = self.user_ids(rows, 'author')
+        groups = dict(
+            Group.objects.filter(slug__in={row['group'] for row in rows})
+            .values_list('slug', 'pk')
+        )
+        return [
+            Post(
+                pk=row['id'] + self.id_offset,
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                image=row['image'] or '',
+                image_width=row.get('image_width'),
+                image_height=row.get('image_height'),
+                image_format=row.get('image_format') or '',
+                image_placeholder=row.get('image_placeholder') or '',
+                author_id=users[row['author']],
+                group_id=groups.get(row['group']),
+            ) for row in rows if row['author'] in users
+        ]
+
+    def build_comment(self, rows):
+        users = self.user_ids(rows, 'author')
+        posts = set(
+            Post.objects.filter(
+                pk__in=[row['post'] + self.id_offset for row in rows]
+            ).values_list('pk', flat=True)
+        )
+        return [
+            Comment(
+                pk=row['id'] + self.id_offset,
+                post_id=row['post'] + self.id_offset,
+                author_id=users[row['author']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            ) for row in rows
+            if row['author'] in users and row['post'] + self.id_offset in posts
+        ]
+
+    def build_follow(self, rows):
+        users = self.user_ids(rows, 'user', 'author')
+        return [
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in rows
+            if row['user'] in users and row['author'] in users
+            and users[row['user']] != users[row['author']]
+        ]
@@ -1,53 +1,108 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.routers import use_primary
+
+from . import feed_cache, thumbnails
+from .conditional import (conditional, group_state, index_state, post_state,
+                          profile_page_state)
+from .feed import get_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Post, User
+from .paginators import KeysetPaginator
+from .rows import post_rows
+from .search import search_posts
 
 POSTS_ON_PAGE = 10
+FEED_PAGE_PARAMS = ('q', 'page', 'after', 'before')
 
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, POSTS_ON_PAGE)
+def get_page_context(queryset, request, keyset=False):
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if keyset and page_number is None:
+        paginator = KeysetPaginator(queryset, POSTS_ON_PAGE)
+        page_obj = paginator.get_keyset_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    else:
+        paginator = Paginator(queryset, POSTS_ON_PAGE)
+        page_obj = paginator.get_page(page_number)
     return {
         'page_obj': page_obj,
     }
 
 
+def get_comments_page(request, comments, per_page):
+    paginator = KeysetPaginator(
+        comments.select_related('author').order_by('created', 'pk'),
+        per_page,
+        key='created',
+        descending=False
+    )
+    return paginator.get_keyset_page(after=request.GET.get('after'))
+
+
+def get_cache_context(request, fragment_name, *generation_keys):
+    """Ключ фрагмента ``fragment_name`` для текущей страницы ленты.
+
+    Вызывается до чтения постов: если фрагмента ещё нет в кэше, он
+    строится по основной базе, а не по реплике, см. ``core/routers.py``.
+    """
+    page_key = '&'.join(
+        f'{name}={request.GET.get(name, "")}' for name in FEED_PAGE_PARAMS
+    )
+    version = feed_cache.get_version(*generation_keys)
+    feed_cache_key = f'{version}|{page_key}'
+    fragment_key = make_template_fragment_key(fragment_name, [feed_cache_key])
+    if cache.get(fragment_key) is None:
+        use_primary()
+    return {
+        'feed_cache_key': feed_cache_key,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+@conditional(index_state, per_user=True)
 def index(request):
     keyword = request.GET.get("q")
+    posts = post_rows(Post.objects.all())
     if keyword:
-        posts = (
-            Post.objects.select_related('author', 'group')
-            .filter(text__contains=keyword)
-        )
-    else:
-        posts = Post.objects.all()
+        posts = search_posts(posts, keyword)
     context = {
         'posts': posts,
         'keyword': keyword
     }
-    context.update(get_page_context(posts, request))
+    context.update(
+        get_cache_context(request, 'index_page', feed_cache.index_key())
+    )
+    context.update(get_page_context(posts, request, keyset=not keyword))
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_state, per_user=True)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    group = request.feed_state.object
+    posts = post_rows(group.posts.all())
     context = {
         'group': group,
         'posts': posts,
     }
-    context.update(get_page_context(posts, request))
+    context.update(get_cache_context(
+        request, 'group_page', feed_cache.group_key(group.pk)
+    ))
+    context.update(get_page_context(posts, request, keyset=True))
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_page_state, per_user=True)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=author)
+    author = request.feed_state.object
+    posts = post_rows(Post.objects.filter(author=author))
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author
@@ -59,14 +114,20 @@ def profile(request, username):
         'author': author,
         'following': following
     }
-    context.update(get_page_context(posts, request))
+    context.update(get_cache_context(
+        request, 'profile_page', feed_cache.author_key(author.pk)
+    ))
+    context.update(get_page_context(posts, request, keyset=True))
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_state, per_user=True)
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
+    post = request.feed_state.object
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_comments_page(
+        request, post.comments, settings.COMMENTS_INLINE
+    )
     author = post.author
     this_user = request.user
     context = {
@@ -79,6 +140,19 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional(post_state, per_user=True)
+def post_comments(request, post_id):
+    comments = get_comments_page(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        settings.COMMENTS_PAGE_SIZE
+    )
+    return render(request, 'posts/includes/comments.html', {
+        'comments': comments,
+        'post_id': post_id,
+    })
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -89,6 +163,7 @@ def post_create(request):
         new_post = form.save(commit=False)
         new_post.author = request.user
         new_post.save()
+        thumbnails.schedule(new_post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -107,6 +182,8 @@ def post_edit(request, post_id):
     if form.is_valid():
         post.text = form.cleaned_data['text']
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post.id)
     return render(request,
                   'posts/create_post.html',
@@ -137,8 +214,14 @@ def post_delete(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    context = {'posts': posts}
+    context = get_cache_context(
+        request,
+        'follow_page',
+        feed_cache.index_key(),
+        feed_cache.follow_key(request.user.pk)
+    )
+    posts = post_rows(get_feed(request.user))
+    context['posts'] = posts
     context.update(get_page_context(posts, request))
     return render(request, 'posts/follow.html', context)
 
@@ -147,11 +230,10 @@ def follow_index(request):
 def profile_follow(request, username):
     user_name = User.objects.get(username=username)
     if not username == request.user.username:
-        new_subscribe, bool = Follow.objects.get_or_create(
+        Follow.objects.get_or_create(
             author=user_name,
             user=request.user
         )
-        new_subscribe.save()
         return redirect('posts:profile', request.user.username)
     return redirect('posts:profile', request.user.username)
 
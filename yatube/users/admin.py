@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'subject',
+        'recipients',
+        'created',
+        'attempts',
+        'next_attempt',
+        'failed',
+    )
+    list_filter = ('failed',)
+    exclude = ('message',)
+    readonly_fields = ('last_error',)
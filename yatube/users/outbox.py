@@ -0,0 +1,114 @@
+"""Очередь исходящих писем.
+
+``OutboxBackend`` подключается как ``EMAIL_BACKEND``: вместо отправки
+он одним INSERT сохраняет письма в таблицу ``OutboxMessage``, поэтому
+обработчик запроса не ждёт почтовый сервер. Команда ``send_outbox``
+разбирает очередь пачками через одно соединение настоящего бэкенда
+``OUTBOX_EMAIL_BACKEND``. Неудачная отправка повторяется с
+экспоненциальной задержкой, после ``OUTBOX_MAX_ATTEMPTS`` попыток
+письмо помечается недоставленным.
+"""
+import logging
+import pickle
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 60 * 60 * 6
+
+
+class OutboxBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        rows = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            # Соединение отправителя не сериализуется и в очереди не нужно.
+            connection, message.connection = message.connection, None
+            try:
+                data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+            finally:
+                message.connection = connection
+            rows.append(OutboxMessage(
+                subject=message.subject[:255],
+                recipients=', '.join(message.recipients()),
+                message=data,
+            ))
+        OutboxMessage.objects.bulk_create(rows)
+        return len(rows)
+
+
+def retry_delay(attempts):
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, MAX_RETRY_DELAY))
+
+
+def _deliver(connection, row, now):
+    try:
+        message = pickle.loads(row.message)
+        message.connection = connection
+        connection.send_messages([message])
+    except Exception as error:
+        row.attempts += 1
+        row.last_error = f'{type(error).__name__}: {error}'
+        row.next_attempt = now + retry_delay(row.attempts)
+        row.failed = row.attempts >= settings.OUTBOX_MAX_ATTEMPTS
+        logger.warning(
+            'Outbox message %s failed (attempt %d): %s',
+            row.pk, row.attempts, row.last_error
+        )
+        return False
+    return True
+
+
+def deliver_batch(connection, batch_size):
+    """Отправляет одну пачку писем, срок которых подошёл.
+
+    Возвращает пару (отправлено, не отправлено). ``select_for_update``
+    с ``skip_locked`` позволяет запускать несколько воркеров на базах,
+    которые это поддерживают; на SQLite воркер должен быть один.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(failed=False, next_attempt__lte=now)
+            .order_by('next_attempt')[:batch_size]
+        )
+        sent, retried = [], []
+        for row in batch:
+            (sent if _deliver(connection, row, now) else retried).append(row)
+        OutboxMessage.objects.filter(pk__in=[row.pk for row in sent]).delete()
+        OutboxMessage.objects.bulk_update(
+            retried, ['attempts', 'last_error', 'next_attempt', 'failed']
+        )
+    return len(sent), len(retried)
+
+
+def deliver(batch_size=100):
+    """Разбирает всю очередь через одно соединение с почтовым сервером.
+
+    Письма, которые не удалось отправить, ждут своей следующей попытки
+    и в этом проходе больше не выбираются.
+    """
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    total_sent = total_failed = 0
+    try:
+        connection.open()
+        while True:
+            sent, failed = deliver_batch(connection, batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < batch_size:
+                break
+    finally:
+        connection.close()
+    return total_sent, total_failed
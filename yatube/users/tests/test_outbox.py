@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import send_mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import outbox
+from ..models import OutboxMessage
+
+User = get_user_model()
+
+
+class BrokenBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+@override_settings(
+    EMAIL_BACKEND='users.outbox.OutboxBackend',
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_MAX_ATTEMPTS=2,
+)
+class OutboxTests(TestCase):
+
+    def send(self, count=1):
+        for i in range(count):
+            send_mail(
+                f'Тема {i}', 'Текст', 'from@example.com', ['to@example.com']
+            )
+
+    def test_send_mail_only_queues(self):
+        """Отправка из кода только сохраняет письмо в очередь"""
+        self.send()
+        self.assertEqual(mail.outbox, [])
+        queued = OutboxMessage.objects.get()
+        self.assertEqual(queued.recipients, 'to@example.com')
+
+    def test_password_reset_is_one_insert(self):
+        """Сброс пароля не ждёт почтовый сервер"""
+        User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse('users:password_reset_form'),
+                {'email': 'user@example.com'}
+            )
+        inserts = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('INSERT')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn(OutboxMessage._meta.db_table, inserts[0])
+        self.assertEqual(mail.outbox, [])
+
+    def test_deliver_in_batches(self):
+        """Очередь разбирается пачками и очищается"""
+        self.send(5)
+        self.assertEqual(outbox.deliver(batch_size=2), (5, 0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, 'Тема 0')
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(
+        OUTBOX_EMAIL_BACKEND='users.tests.test_outbox.BrokenBackend'
+    )
+    def test_retry_with_backoff(self):
+        """Неудачная отправка откладывается, затем письмо помечается"""
+        self.send()
+        with self.assertLogs('users.outbox', 'WARNING'):
+            self.assertEqual(outbox.deliver(), (0, 1))
+        queued = OutboxMessage.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('SMTP недоступен', queued.last_error)
+        self.assertGreater(queued.next_attempt, timezone.now())
+        self.assertEqual(outbox.deliver(), (0, 0))
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        with self.assertLogs('users.outbox', 'WARNING'):
+            outbox.deliver()
+        queued.refresh_from_db()
+        self.assertTrue(queued.failed)
+        self.assertGreater(
+            outbox.retry_delay(2), outbox.retry_delay(1)
+        )
@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,9 +93,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос и не настраивается заново.
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Реплики только для чтения, см. core/routers.py. Локально это копии
+# db.sqlite3, которые обновляет команда sync_replicas, например
+# DATABASE_REPLICAS = ['replica1', 'replica2'].
+DATABASE_REPLICAS = []
+DATABASES.update({
+    alias: {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias in DATABASE_REPLICAS
+})
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает только с основной базы.
+REPLICA_PIN_SECONDS = 10
+
+# Выполняются при каждом новом соединении с SQLite, см. core/db.py.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -113,12 +144,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Общий для всех воркеров кэш в файле SQLite, см. core/cache.py
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 
+# Во время тестов кэши лежат во временном каталоге, см. core/testing.py.
+TEST_RUNNER = 'core.testing.TestRunner'
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -141,6 +181,10 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки хранятся по хешу содержимого, см. core/storage.py.
+# Миниатюры sorl-thumbnail уникальны и лежат в обычном хранилище.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
 LOGIN_URL = 'users:login'
 LOGOUT_URL = 'users:logout'
@@ -151,9 +195,84 @@ PASSWORD_RESET_URL = 'users:password_reset_form'
 PASSWORD_RESET_DONE_URL = 'users:password_reset_done'
 PASSWORD_RESET_CONFIRM_URL = 'users:password_reset_confirm'
 PASSWORD_RESET_COMPLETE_URL = 'users:password_reset_complete'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
-
+# Письма из запросов только ставятся в очередь, отправляет их команда
+# send_outbox через OUTBOX_EMAIL_BACKEND, см. users/outbox.py.
+EMAIL_BACKEND = 'users.outbox.OutboxBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Лента подписок: авторам с большим числом подписчиков посты не
+# раскладываются по лентам при записи, а подмешиваются при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BATCH_SIZE = 500
+
+# Сколько хранить закэшированные фрагменты лент. Устаревание не нужно:
+# ключи фрагментов меняются при каждой записи в ленту.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Сколько хранить HTML карточки поста. Ключ включает версию поста,
+# поэтому изменённая карточка отрисовывается заново, см. posts/cards.py.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько комментариев показывать на странице поста и сколько
+# подгружать кнопкой «Показать ещё».
+COMMENTS_INLINE = 20
+COMMENTS_PAGE_SIZE = 50
+
+# Картинки постов перекодируются при загрузке, большая сторона
+# уменьшается до IMAGE_MAX_SIZE пикселей, см. posts/images.py.
+IMAGE_MAX_SIZE = 2560
+IMAGE_QUALITY = 85
+# Сторона размытой заглушки картинки, которая хранится в посте.
+IMAGE_PLACEHOLDER_SIZE = 16
+
+# Миниатюры картинок постов, которые показывают шаблоны: вариант ->
+# (геометрия, опции sorl-thumbnail). Строятся в фоне после загрузки,
+# см. posts/thumbnails.py. При THUMBNAIL_WORKERS = 0 — сразу в запросе.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'profile': ('960x339', {'crop': 'center', 'upscale': False}),
+}
+# Ширины, в которых шаблоны показывают вариант, и они же вдвое для
+# экранов высокой плотности: карточка ленты — 20px (includes/body.html),
+# карточка профиля — 230px (includes/profile_card.html). Основной размер
+# из POST_THUMBNAILS тоже остаётся в srcset: его показывает страница
+# поста. Современные форматы для srcset, которые не умеет сохранять
+# установленный Pillow, пропускаются.
+POST_THUMBNAIL_WIDTHS = {
+    'card': (20, 40),
+    'profile': (230, 460),
+}
+POST_THUMBNAIL_FORMATS = ('WEBP',)
+THUMBNAIL_WORKERS = 2
+
+# Бюджет SQL-запросов на один запрос к странице, см. core/middleware.py.
+# Превышение пишется в лог, а тесты tests/test_query_budget.py падают.
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGETS = {
+    'posts:main_page': 8,
+    'posts:group_list': 5,
+    'posts:profile': 7,
+    'posts:post_detail': 5,
+    'posts:post_comments': 5,
+    # Картинка добавляет запросы хранилища (core/storage.py): проверку
+    # имени, INSERT … ON CONFLICT в Blob, запись StoredFile и транзакцию
+    # вокруг них (BEGIN или SAVEPOINT и RELEASE внутри другой).
+    'posts:post_create': 15,
+    'posts:post_edit': 10,
+    'posts:post_delete': 20,
+    'posts:add_comment': 8,
+    'posts:follow_index': 6,
+    'posts:profile_follow': 12,
+    'posts:profile_unfollow': 14,
+    'api_v1:index': 2,
+    'api_v1:group_list': 2,
+    'api_v1:profile': 2,
+    'api_v1:post_comments': 2,
+}
+QUERY_COUNT_HEADER = DEBUG